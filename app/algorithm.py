@@ -1,11 +1,15 @@
-"""This module implements algorithm 1 from the paper
+"""This module implements algorithm 1 from the paper, and runs it or any other allocation policy over a ContainerList
 """
 
 import multiprocessing
 import time
 
+import numpy as np
+
 import utils
+from app.policies import Algo1Policy, Snapshot
 from app.resource_monitor import *
+from app.tracer import tracer
 import logging
 
 logger = utils.get_logger(__name__)
@@ -22,96 +26,114 @@ def algo_1(containers, monitor, alpha, beta, interval, last_run):
 
     TODO refactor such that interval and alpha can vary independently for each container
     """
+    return run_policy(Algo1Policy(alpha), containers, monitor, beta=beta, interval=interval, last_run=last_run)
 
 
-    logger.info("Running algorithm 1 with parameters alpha = {}, interval = {}".format(alpha, interval))
-
-    delta_t = 0 if last_run is None else round(time.time() - last_run, 2)
+def snapshot(containers, monitor, beta, interval, uses_cpu=False, uses_io=False):
+    """Collect the telemetry of every container into a Snapshot
 
-    # accumulators for pandas DF
-    growth = [0] * len(containers)
-    loss = [0] * len(containers)
-    progress = [0] * len(containers)
-    ages = [0] * len(containers)
-    ignore = [False] * len(containers)
+    :param uses_cpu: also collect each container's mean CPU use over the last interval
+    :param uses_io: also collect each container's I/O rate over the last interval
+    """
+    n = len(containers)
+    growth = np.zeros(n)
+    loss = np.zeros(n)
+    progress = np.zeros(n)
+    ages = np.zeros(n)
+    cpu_mean = np.full(n, np.nan)
+    io_rate = np.full(n, np.nan)
 
-    all_completing = True
     for i, c in enumerate(containers):
-        all_completing = False if not c.completing else all_completing
-
         growth[i] = c.growth(monitor)
         loss[i] = c.E_i
         progress[i] = c.progress
         ages[i] = c.age
+        if uses_cpu:
+            mean = monitor.cpu_mean(c.id, interval)
+            cpu_mean[i] = np.nan if mean is None else mean
+        if uses_io:
+            rate = monitor.io_rate(c.id, interval)
+            io_rate[i] = np.nan if rate is None else rate
+
+    return Snapshot(
+        ids=[c.id for c in containers],
+        growth=growth,
+        loss=loss,
+        progress=progress,
+        ages=ages,
+        watching=np.array([bool(c.watching) for c in containers], dtype=bool),
+        completing=np.array([bool(c.completing) for c in containers], dtype=bool),
+        limits=np.array([c.cpu_lim for c in containers], dtype=float),
+        cpu_mean=cpu_mean,
+        io_rate=io_rate,
+        weights=np.array([c.priority for c in containers], dtype=float),
+        slack=np.array([np.nan if c.slack is None else c.slack for c in containers], dtype=float),
+        n_cpus=multiprocessing.cpu_count(),
+        beta=beta
+    )
+
+
+@tracer.traced('run_policy')
+def run_policy(policy, containers, monitor, beta, interval, last_run):
+    """Run an allocation policy over a ContainerList and apply its decisions
+    :param policy: a policies.Policy
+    :param containers: the ContainerList for the session
+    :param monitor: the DockerMonitor for the session
+    :param beta: weight for old containers vs new containers
+    :param interval: time interval over which to run the algorithm
+    :return: a pandas DF of the status of all monitored containers after the run of the policy
+    """
+    logger.info("Running policy %s with parameters alpha = %s, interval = %s", policy.name, policy.alpha, interval)
+
+    delta_t = 0 if last_run is None else round(time.time() - last_run, 2)
 
-        G = growth[i]
-        if G < alpha and not c.completing:
-            logger.info("Marking {} as watching".format(c.id))
-            if c.watching:
-                logger.info("Marking {} as completing".format(c.id))
-                c.completing = True
-            else:
-                c.completing = False
-            c.watching = not c.watching
-        elif G >= alpha:
-            logger.info("Marking {} as neither watching nor completing".format(c.id))
-            c.watching = c.completing = False
-
-    new_lim = multiprocessing.cpu_count()
-    if all_completing and len(containers) != 0:
-        for c in containers:
-            c.cpu_lim = multiprocessing.cpu_count()
-
-    else:  # if containers.has_growing:
-        # Then we still have some containers that are growing fast
-        # Apply resource limits from lines 16-22 of the algorithm as written in the paper
-        growth_sum = sum(growth)
-        logger.info("Value for growth sum: {:.3f}".format(growth_sum))
-        for i, c in enumerate(containers):
-            if growth_sum == 0:
-                break
-            if not c.watching:
-                growth_ratio = growth[i] / growth_sum
-                if c.completing:
-                    new_lim = max(growth_ratio, 1 / (beta * len(containers)))
-                else:
-                    new_lim = min(growth_ratio, 1)
-            if len(containers) == 0:
-                break
-            # else:
-            #     new_lim = min(new_lim, 1)
-
-            if not c.watching:
-                c.cpu_lim = new_lim * multiprocessing.cpu_count()
+    s = snapshot(containers, monitor, beta=beta, interval=interval, uses_cpu=policy.uses_cpu, uses_io=policy.uses_io)
+    allocation = policy.allocate(s)
+
+    for i, c in enumerate(containers):
+        watching = bool(allocation.watching[i])
+        completing = bool(allocation.completing[i])
+        if watching != s.watching[i] or completing != s.completing[i]:
+            state = "watching" if watching else "completing" if completing else "neither watching nor completing"
+            logger.info("Marking %s as %s", c.id, state, extra={'c_id': c.id})
+        c.watching = watching
+        c.completing = completing
+        if not np.isnan(allocation.limits[i]):
+            c.cpu_lim = allocation.limits[i]
+        if allocation.blkio_weights is not None and not np.isnan(allocation.blkio_weights[i]):
+            c.blkio_weight = int(allocation.blkio_weights[i])
 
     now = time.time()
     limits = [c.cpu_lim for c in containers]
-    W = [c.watching for c in containers]
-    C = [c.completing for c in containers]
-    ids = [c.id for c in containers]
     num_containers = len(containers)
     num_watching = containers.num_watching
     num_completing = containers.num_completing
 
     status = pd.DataFrame(dict(
         time=now,
-        c_id=ids,
-        age=ages,
-        ignore=ignore,
-        loss=loss,
-        progress=progress,
-        growth=growth,
+        c_id=s.ids,
+        age=s.ages,
+        ignore=False,
+        loss=s.loss,
+        progress=s.progress,
+        growth=s.growth,
         limit=limits,
-        watching=W,
-        completing=C,
+        watching=allocation.watching,
+        completing=allocation.completing,
         delta_t=delta_t,
         num_containers=num_containers,
         num_watching=num_watching,
         num_completing=num_completing,
-        beta=beta
+        beta=beta,
+        policy=policy.name,
+        priority=s.weights,
+        slack=s.slack,
+        io_rate=s.io_rate,
+        blkio_weight=[getattr(c, 'blkio_weight', None) for c in containers]
     ))
     status = status[['time', 'age', 'ignore', 'c_id', 'loss', 'progress', 'growth', 'limit', 'watching', 'completing',
-                     'delta_t', 'num_containers', 'num_watching', 'num_completing', 'beta']]
+                     'delta_t', 'num_containers', 'num_watching', 'num_completing', 'beta', 'policy', 'priority',
+                     'slack', 'io_rate', 'blkio_weight']]
 
     normalized_limit = status['limit'] / multiprocessing.cpu_count()
     status.insert(8, 'limit_norm', normalized_limit)
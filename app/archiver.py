@@ -0,0 +1,102 @@
+"""Background archival of trial logs
+
+A LogArchiver owns the trial's `<name>_logs.zip` and a small pool of worker threads. When a container leaves, the
+ContainerList hands its ContainerWrapper to `submit`, and a worker fetches whatever output the container produced
+since its loss history was last parsed, renders the CSV and writes it compressed straight into the archive. Other
+log files are queued with `submit_file` at the end of the trial. Only the writes into the zip are serialized. The
+controller's own log is archived last, once the workers are done, so that anything they log is in it.
+
+Entries are stored under `<name>/`, the same layout that Trial.zip_logs has always produced.
+"""
+
+import os
+import sys
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app.tracer import tracer
+from utils import get_logger, stop_logging
+
+logger = get_logger(__name__)
+
+
+class LogArchiver(object):
+    """Write container loss tables and other log files into the trial archive from a worker pool"""
+
+    def __init__(self, experiment_name, workers=2):
+        """
+        :param experiment_name: the name of the controlling Trial instance
+        :param workers: number of worker threads
+        """
+        self.experiment_name = experiment_name
+        self.path            = '{}_logs.zip'.format(experiment_name)
+        self._pool           = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='LogArchiver')
+        self._lock           = threading.Lock()
+        self._zip            = None
+
+    def _arcname(self, filename):
+        return '{}/{}'.format(self.experiment_name, os.path.basename(filename))
+
+    def _writestr(self, filename, data):
+        with self._lock:
+            if self._zip is None:
+                self._zip = zipfile.ZipFile(self.path, 'a', zipfile.ZIP_DEFLATED)
+            self._zip.writestr(self._arcname(filename), data)
+
+    def _archive_container(self, container):
+        try:
+            with tracer.span('archive container logs', c_id=container.id):
+                table = container.final_loss_logs()
+                self._writestr('{}_{}.csv'.format(self.experiment_name, container.id), table.to_csv(index=False))
+            logger.info("Archived logs for container {}".format(container.id))
+        except Exception:
+            logger.exception("Failed to archive logs for container {}".format(container.id))
+
+    def _archive_file(self, path, remove):
+        try:
+            with tracer.span('archive file', path=path):
+                with open(path, 'rb') as f:
+                    self._writestr(path, f.read())
+            if remove:
+                os.remove(path)
+        except Exception:
+            logger.exception("Failed to archive {}".format(path))
+
+    def submit(self, container):
+        """Archive the loss table of a ContainerWrapper whose container has exited, in the background"""
+        logger.info("Queueing logs of container {} for archival".format(container.id))
+        self._pool.submit(self._archive_container, container)
+
+    def submit_file(self, path, remove=True):
+        """Copy the file at `path` into the archive in the background, then delete it if `remove`"""
+        self._pool.submit(self._archive_file, path, remove)
+
+    def _finish(self, log_file=None):
+        self._pool.shutdown(wait=True)
+        if log_file is not None:
+            stop_logging()
+            try:
+                with open(log_file, 'rb') as f:
+                    self._writestr(log_file, f.read())
+                os.remove(log_file)
+            except Exception as e:  # logging has stopped, so this can only be reported on stderr
+                sys.stderr.write("Failed to archive {}: {}\n".format(log_file, e))
+        with self._lock:
+            if self._zip is None:
+                self._zip = zipfile.ZipFile(self.path, 'a', zipfile.ZIP_DEFLATED)
+            self._zip.close()
+
+    def close(self, wait=False, log_file=None):
+        """Close the archive once all queued work is done
+
+        :param wait: block until then; otherwise a non-daemon thread finishes up, so the process still exits only
+                     once the archive is complete
+        :param log_file: the controller's log file; once the queued work is done, logging is stopped and this file
+                         is archived and deleted
+        :return: None
+        """
+        if wait:
+            self._finish(log_file)
+        else:
+            threading.Thread(target=self._finish, args=(log_file,), name='LogArchiver-close').start()
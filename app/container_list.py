@@ -1,7 +1,10 @@
 import subprocess
+import time
 import logging
 
 from app.container_wrapper import ContainerWrapper
+from app.tracer import tracer
+from utils import get_container_labels
 from utils import get_logger
 
 logger = get_logger(__name__)
@@ -10,15 +13,21 @@ logger = get_logger(__name__)
 class ContainerList(object):
     """A list-like object for storing ContainerWrappers"""
 
-    def __init__(self, trial_start, interval, no_update=False, *args):
+    def __init__(self, trial_start, interval, no_update=False, *args, log_source='docker', archiver=None):
         """Create self from a comma-separated list of ContainerWrappers
         :param *args: ContainerWrapper objects to store in instance
+        :param log_source: passed to the ContainerWrappers created by `reconcile`
+        :param archiver: a LogArchiver to save the logs of exiting containers in the background; if None they are
+                         saved to csv on the calling thread
         """
         logger.info("Initializing ContainerList")
         self.no_update      = no_update
         self.containers     = []
         self.interval       = interval
         self.trial_start    = trial_start
+        self.log_source     = log_source
+        self.archiver       = archiver
+        self.finished       = []  # one record per container that exited during the trial, see self._finish
         self.add(*args)
 
     def add(self, *args):
@@ -35,6 +44,7 @@ class ContainerList(object):
         # logger.info("Adding {} containers to ContainerList".format(len(args)))
         self.containers.extend(list(args))
 
+    @tracer.traced('ContainerList.reconcile')
     def reconcile(self, experiment_name, no_update=False):
         """Reconcile the state of the container list with the state of currently active containers
 
@@ -46,21 +56,52 @@ class ContainerList(object):
 
         logger.info('Reconciling ContainerList with docker ps')
 
-        active_containers = subprocess.check_output(['docker', 'ps', '-q']).decode('ascii').split('\n')[:-1]
+        with tracer.span('docker ps'):
+            active_containers = subprocess.check_output(['docker', 'ps', '-q']).decode('ascii').split('\n')[:-1]
 
         for c_id in active_containers:
             if c_id not in self.ids:
-                c = ContainerWrapper(id=c_id, updatable=not no_update,
-                                     trial_start=self.trial_start, interval=self.interval)
+                labels = get_container_labels(c_id)
+                deadline = labels.get('flowcon.deadline')
+                c = ContainerWrapper(id=c_id, updatable=not no_update, trial_start=self.trial_start,
+                                     interval=self.interval, log_source=self.log_source,
+                                     njobs=int(labels.get('flowcon.njobs', 1)),
+                                     priority=float(labels.get('flowcon.priority', 1)),
+                                     deadline=None if deadline is None else float(deadline))
                 logger.info('Adding {} to ContainerList'.format(c_id))
                 self.add(c)
 
-        for c in self:
+        for c in list(self.containers):
             if c.id not in active_containers:
                 logger.info('Removing {} from ContainerList'.format(c.id))
-                c.save_logs(experiment_name=experiment_name)
+                self._finish(c)
+                self._save_logs(c, experiment_name)
                 self.containers.remove(c)
 
+    def _finish(self, container, killed=False):
+        """Record when a container exited, whether it met its deadline and how long it spent paused
+
+        :param killed: the container was still running when the trial killed it, so it missed any deadline
+        """
+        now = time.time()
+        met = None if container.deadline is None else not killed and now <= container.deadline
+        if met is not None:
+            logger.info('Container {} {} its deadline'.format(container.id, 'met' if met else 'missed'))
+        self.finished.append(dict(c_id=container.id, priority=container.priority, deadline=container.deadline,
+                                  finished=now, met=met, frozen_time=container.frozen_time, killed=killed))
+
+    @property
+    def deadlines_met(self):
+        """Return (met, total) over the containers with a deadline that have exited so far"""
+        results = [record['met'] for record in self.finished if record['met'] is not None]
+        return sum(results), len(results)
+
+    def _save_logs(self, container, experiment_name):
+        if self.archiver is not None:
+            self.archiver.submit(container)
+        else:
+            container.save_logs(experiment_name=experiment_name)
+
     def __iter__(self):
         for container in self.containers:
             yield container
@@ -69,11 +110,14 @@ class ContainerList(object):
         return len(self.containers)
 
     def killall(self, experiment_name, save_logs=True):
-        """Kill all ContainerWrappers in self"""
+        """Kill all ContainerWrappers in self, recording each as finished without meeting its deadline"""
         for container in self:
-            if save_logs:
+            self._finish(container, killed=True)
+            if save_logs and self.archiver is None:
                 container.save_logs(experiment_name=experiment_name)
             container.kill()
+            if save_logs and self.archiver is not None:
+                self.archiver.submit(container)
 
     @property
     def all_completing(self):
@@ -1,4 +1,3 @@
-import re
 import subprocess
 import time
 from multiprocessing import cpu_count
@@ -8,71 +7,136 @@ import logging
 import numpy as np
 import pandas as pd
 
+from app.log_source import JsonFileLogSource, parse_loss_lines
+from app.policies import DEFAULT_BLKIO_WEIGHT
+from app.tracer import tracer
 from utils import get_logger
 
 logger = get_logger(__name__)
 
 
+def interval_loss(loss_logs, now, interval):
+    """Mean normalized loss over this interval and the previous interval as described in the paper
+
+    :param loss_logs: a pd.DataFrame with columns 'loss' and 'time', as returned by ContainerWrapper._complete_loss_logs
+    :param now: the time at which the current interval ends
+    :param interval: length of an interval in seconds
+    :return: a tuple (E_i, E_i_minus_1), either of which is NaN if there are no observations in its interval
+    """
+    loss = loss_logs['loss']
+    times = loss_logs['time']
+    loss = loss/loss.max()
+    # See writeup of Algorithm 1 in paper to disambiguate notational choices here
+    loss_over_this_interval = loss[times >= now - interval]
+    loss_over_last_interval = loss[(now - 2 * interval <= times) & (times <= now - interval)]
+    logger.debug('Num observations over this interval: %d', len(loss_over_this_interval))
+    logger.debug('Num observations over last interval: %d', len(loss_over_last_interval))
+    return loss_over_this_interval.mean(), loss_over_last_interval.mean()
+
+
+def job_interval_loss(loss_logs, now, interval):
+    """interval_loss for each job of a container that runs several, each job's loss being normalized by its own maximum
+
+    :param loss_logs: a pd.DataFrame with columns 'loss', 'time' and 'job'; observations without a job are ignored
+    :param now: the time at which the current interval ends
+    :param interval: length of an interval in seconds
+    :return: a pd.DataFrame indexed by job with columns 'E_i' and 'E_i_minus_1', NaN where a job has no
+             observations in an interval
+    """
+    logs = loss_logs.dropna(subset=['job'])
+    jobs = logs['job']
+    times = logs['time']
+    loss = logs['loss'] / logs.groupby('job')['loss'].transform('max')
+    loss_over_this_interval = loss[times >= now - interval].groupby(jobs).mean()
+    loss_over_last_interval = loss[(now - 2 * interval <= times) & (times <= now - interval)].groupby(jobs).mean()
+    return pd.DataFrame({'E_i': loss_over_this_interval, 'E_i_minus_1': loss_over_last_interval},
+                        index=pd.Index(sorted(jobs.unique()), name='job'))
+
+
+def job_progress(losses, interval):
+    """Progress of each job from the result of job_interval_loss, 0 where either interval has no observations"""
+    return ((losses['E_i'] - losses['E_i_minus_1']).abs() / interval).fillna(0)
+
+
 class ContainerWrapper(object):
     """A python interface to docker containers running ML jobs
 
     Allows us to monitor the state of evaluation functions and update resource limits.
     """
 
-    def __init__(self, trial_start, interval, id=None, njobs=1, updatable=True):
+    def __init__(self, trial_start, interval, id=None, njobs=1, updatable=True, log_source='docker', priority=1,
+                 deadline=None):
         """
         :param id: Container ID: if create=True then this has no effect
         :param create: if True, the ContainerWrapper will create a container based on `image`, `wd`, and `script`
         :param image: see `create`
         :param wd: see `create`
         :param script: see `create`
-        :param njobs: number of ML jobs running within the container. Currently only supports 1.
+        :param njobs: number of ML jobs running within the container. With more than one, each job tags its output
+                      with `Job: <name>`, and loss, progress and growth are tracked per job in self.jobs
         :param updatable: determines if we can apply resource updates to this container
+        :param log_source: 'docker' to parse the full output of `docker logs` on every read, or 'json-file' to
+                           memory-map the json-file driver's log on disk and only parse what was appended
+        :param priority: weight of the job when allocating CPU; 1 is the lowest
+        :param deadline: unix time by which the job should finish, or None
         """
         self.id             = id
         self.updatable      = updatable
         self.mem_lim        = None
+        self._blkio_weight  = None
         self.cpu_lim        = cpu_count()
         self.njobs          = njobs
+        self.priority       = priority
+        self.deadline       = deadline
         self.watching       = None   # TODO: In my option, these properties are pretty sloppy OO.
         self.completing     = None   # They are essentially using a ContainerWrapper object to store data for logic
-        self.frozen         = False  # external to the container object leading to class bloat
+        self._frozen        = False  # external to the container object leading to class bloat
+        self._frozen_at     = None
+        self._frozen_time   = 0
         self._creation_time = time.time()
         self._last_checked  = 0
         self.__E_i           = 0
         self.__E_i_minus_1   = 0
         self.trial_start    = trial_start
         self.interval       = interval
-        if njobs != 1:
-            raise NotImplementedError('Currently only supports one job')
+        self.log_source     = JsonFileLogSource.from_container(id) if log_source == 'json-file' else None
+        self._loss          = []
+        self._loss_time     = []
+        self._job           = []
+        self.jobs           = None  # per-job E_i, E_i_minus_1, progress and growth if njobs > 1
+        self.jobs_updated   = 0     # when self.jobs was last recomputed
+        self.loss_history   = None  # the most recent result of self._complete_loss_logs, shared with shadow policies
+        self._parsed_at     = 0
 
     @property
     def _complete_loss_logs(self):
-        """Parse the container logs and return a pd.DataFrame of the loss function over the lifetime of the container"""
-
-        if self.njobs == 1:
-            logs = subprocess.check_output(['docker', 'logs', self.id])
-            logs = logs.split(b"\n")
-            loss = []
-            timestamp = []
-            for line in logs[:-1]:
-                try:
-                    l = float(re.search(b'Loss: ([0-9.]+)', line).group(1))
-                    t = float(re.search(b'Time: ([0-9.]+)', line).group(1))
-                except AttributeError:  # If re.search returns NoneType, which has no attribute 'group'
-                    continue
-                else:
-                    loss.append(l)
-                    timestamp.append(t)
-
-            history = pd.DataFrame({'loss': loss, 'time': timestamp})
+        """Parse the container logs and return a pd.DataFrame of the loss function over the lifetime of the container
 
+        The 'job' column holds the job tag of each observation, or None if it is untagged.
+        """
+        if self.log_source is None:
+            with tracer.span('docker logs', c_id=self.id):
+                logs = subprocess.check_output(['docker', 'logs', self.id])
+                loss, timestamp, job = parse_loss_lines(logs)
         else:
-            raise NotImplementedError("This should never happen: currently only supports one job")
-            # When more than one job is supported, this method will have to change
+            with tracer.span('read json-file log', c_id=self.id):
+                new_loss, new_timestamp, new_job = self.log_source.read_new()
+            self._loss.extend(new_loss)
+            self._loss_time.extend(new_timestamp)
+            self._job.extend(new_job)
+            loss, timestamp, job = self._loss, self._loss_time, self._job
 
+        history = pd.DataFrame({'loss': loss, 'time': timestamp, 'job': job})
+        self.loss_history = history
+        self._parsed_at = time.time()
         return history
 
+    def loss_logs(self, max_age):
+        """Return self.loss_history, re-reading the logs only if it was parsed more than `max_age` seconds ago"""
+        if self.loss_history is None or time.time() - self._parsed_at > max_age:
+            return self._complete_loss_logs
+        return self.loss_history
+
     @property
     def cpu_lim(self):
         """CPU limit placed on container where the unit is the number of cpus
@@ -85,50 +149,105 @@ class ContainerWrapper(object):
     @cpu_lim.setter
     def cpu_lim(self, limit):
         if self.updatable:
-            logger.info("Setting container {} cpu limit to {}".format(self.id, limit))
-            response = subprocess.check_output(['docker', 'update', '--cpus', str(int(limit)), self.id])
-            logger.info("Docker response: {}".format(response))
+            logger.info("Setting container %s cpu limit to %s", self.id, limit, extra={'c_id': self.id})
+            with tracer.span('docker update', c_id=self.id, cpus=limit):
+                response = subprocess.check_output(['docker', 'update', '--cpus', str(int(limit)), self.id])
+            logger.debug("Docker response: %s", response, extra={'c_id': self.id})
             self._cpu_lim = limit
 
+    @property
+    def blkio_weight(self):
+        """Relative block I/O weight of the container, in [10, 1000], or None if never set
+
+        Setting blkio_weight causes an instance to run `docker update --blkio-weight weight self.id`, unless it
+        already has that weight; a container that was never given one has docker's default weight
+        """
+        return self._blkio_weight
+
+    @blkio_weight.setter
+    def blkio_weight(self, weight):
+        current = DEFAULT_BLKIO_WEIGHT if self._blkio_weight is None else self._blkio_weight
+        if self.updatable and weight != current:
+            logger.info("Setting container %s blkio weight to %s", self.id, weight, extra={'c_id': self.id})
+            with tracer.span('docker update', c_id=self.id, blkio_weight=weight):
+                subprocess.check_output(['docker', 'update', '--blkio-weight', str(weight), self.id])
+            self._blkio_weight = weight
+
+    @property
+    def frozen(self):
+        """Whether the container is paused
+
+        Setting frozen causes an instance to run `docker pause self.id` or `docker unpause self.id`
+        """
+        return self._frozen
+
+    @frozen.setter
+    def frozen(self, frozen):
+        if self.updatable and frozen != self._frozen:
+            command = 'pause' if frozen else 'unpause'
+            logger.info("Running docker %s on container %s", command, self.id, extra={'c_id': self.id})
+            with tracer.span('docker ' + command, c_id=self.id):
+                subprocess.check_output(['docker', command, self.id])
+            now = time.time()
+            if frozen:
+                self._frozen_at = now
+            else:
+                self._frozen_time += now - self._frozen_at
+            self._frozen = frozen
+
+    @property
+    def frozen_time(self):
+        """Total number of seconds the container has spent paused"""
+        if self._frozen:
+            return self._frozen_time + time.time() - self._frozen_at
+        return self._frozen_time
+
     @property
     def age(self):
         return time.time() - self.trial_start
 
+    @property
+    def slack(self):
+        """Fraction of the time between creation and the deadline that is left
+
+        Negative once the deadline has passed, None if the container has no deadline.
+        """
+        if self.deadline is None:
+            return None
+        return (self.deadline - time.time()) / max(self.deadline - self._creation_time, 1e-6)
+
     def _compute_loss(self):
         """Compute the loss over this interval and the previous interval as described in the paper"""
-        logger.info('Computing mean loss over intervals i and i-1')
+        logger.debug('Computing mean loss over intervals i and i-1 for %s', self.id, extra={'c_id': self.id})
         now = time.time()
-        interval = self.interval
-        loss_logs = self._complete_loss_logs
-        loss = loss_logs['loss']
-        times = loss_logs['time']
-        loss = loss/loss.max()
-        # See writeup of Algorithm 1 in paper to disambiguate notational choices here
-        loss_over_this_interval = loss[times >= now - interval]
-        loss_over_last_interval = loss[(now - 2 * interval <= times) & (times <= now - interval)]
-        logger.info('Num observations over this interval: {}'.format(len(loss_over_this_interval)))
-        logger.info('Num observations over last interval: {}'.format(len(loss_over_last_interval)))
-        self.__E_i = loss_over_this_interval.mean()
-        self.__E_i_minus_1 = loss_over_last_interval.mean()
-        logger.info("Set self.__E_i to {}".format(self.__E_i))
-        logger.info("Set self.__E_i_minus_1 to {}".format(self.__E_i_minus_1))
+        if self.njobs == 1:
+            self.__E_i, self.__E_i_minus_1 = interval_loss(self._complete_loss_logs, now, self.interval)
+        else:
+            # The container's loss is the mean of its jobs' normalized losses, and its progress their sum
+            jobs = job_interval_loss(self._complete_loss_logs, now, self.interval)
+            jobs['progress'] = job_progress(jobs, self.interval)
+            self.jobs = jobs
+            self.jobs_updated = now
+            self.__E_i, self.__E_i_minus_1 = jobs['E_i'].mean(), jobs['E_i_minus_1'].mean()
+        logger.info("Set E_i to %s and E_i_minus_1 to %s for %s", self.__E_i, self.__E_i_minus_1, self.id,
+                    extra={'c_id': self.id, 'E_i': self.__E_i, 'E_i_minus_1': self.__E_i_minus_1})
 
     @property
     def E_i(self):
-        logger.info("Checking self.E_i")
+        logger.debug("Checking self.E_i")
         delta_t = time.time() - self._last_checked
         if delta_t > self.interval:
-            logger.info("Time since checked: {}".format(delta_t))
+            logger.debug("Time since checked: %.2f", delta_t)
             self._compute_loss()
             self._last_checked = time.time()
         return self.__E_i
 
     @property
     def E_i_minus_1(self):
-        logger.info("Checking self.E_i_minus_1")
+        logger.debug("Checking self.E_i_minus_1")
         delta_t = time.time() - self._last_checked
         if abs(delta_t - self.interval) < 2.0:
-            logger.info("Time since checked: {}".format(delta_t))
+            logger.debug("Time since checked: %.2f", delta_t)
             self._compute_loss()
             self._last_checked = time.time()
         self._last_checked = time.time()
@@ -136,32 +255,63 @@ class ContainerWrapper(object):
 
     @property
     def progress(self):
-        logger.info("Running self.progress")
+        logger.debug("Running self.progress")
         E_i = self.E_i
         E_i_minus_1 = self.E_i_minus_1
+        if self.njobs != 1:
+            return 0 if self.jobs is None else self.jobs['progress'].sum()
         if np.isnan(E_i_minus_1) or np.isnan(E_i):
             return 0
-        logger.info("Computing progress with abs({} - {}) / {}".format(self.__E_i, self.__E_i_minus_1, self.interval))
-        return abs(self.E_i - self.E_i_minus_1) / self.interval
+        logger.debug("Computing progress with abs(%s - %s) / %s", E_i, E_i_minus_1, self.interval)
+        return abs(E_i - E_i_minus_1) / self.interval
 
     def growth(self, monitor, threshold=0):
-        logger.info("Running self.growth")
+        logger.debug("Running self.growth")
         if threshold > 0:
             raise NotImplementedError("We haven't implemented anything for threshold > 0, got threshold = {}".format(threshold))
 
+        if self.frozen:
+            # A paused container makes no progress and uses no CPU
+            return 0
+
         E_i_minus_1 = self.E_i_minus_1
 
         if np.isnan(E_i_minus_1):
-            logger.warning("E_i_minus_1 is NaN")
+            logger.warning("E_i_minus_1 is NaN for %s", self.id, extra={'c_id': self.id})
             return 0
 
         cpu_mean = monitor.cpu_mean(self.id, self.interval)
         if cpu_mean is None:
-            logger.warning("No cpu mean")
+            logger.warning("No cpu mean for %s", self.id, extra={'c_id': self.id})
             return 0
 
-        logger.info("Computing growth with {} / {}".format(self.progress, cpu_mean))
-        return self.progress / cpu_mean
+        progress = self.progress
+        if self.jobs is not None:
+            # CPU use is only known per container, so each job's growth is its progress per unit of the container's
+            # CPU, and the container's growth is the sum over its jobs
+            self.jobs['growth'] = self.jobs['progress'] / cpu_mean
+            logger.debug("Growth by job for %s: %s", self.id, self.jobs['growth'].to_dict(), extra={'c_id': self.id})
+        logger.info("Computing growth for %s with %s / %s", self.id, progress, cpu_mean,
+                    extra={'c_id': self.id, 'progress': progress, 'cpu_mean': cpu_mean})
+        return progress / cpu_mean
+
+    def final_loss_logs(self):
+        """Return the loss history over the whole lifetime of the container, reusing what has already been parsed
+
+        With the json-file log source every read is incremental already. With `docker logs`, only the output since
+        the last parse is fetched (`docker logs --since`), and rows that overlap the parsed history are dropped.
+        """
+        if self.log_source is not None or self.loss_history is None:
+            return self._complete_loss_logs
+
+        history = self.loss_history
+        with tracer.span('docker logs --since', c_id=self.id):
+            logs = subprocess.check_output(['docker', 'logs', '--since', '{:.3f}'.format(self._parsed_at - 1), self.id])
+            loss, timestamp, job = parse_loss_lines(logs)
+        new = pd.DataFrame({'loss': loss, 'time': timestamp, 'job': job})
+        if not history.empty:
+            new = new[new.time > history.time.max()]
+        return pd.concat([history, new], ignore_index=True)
 
     def save_logs(self, experiment_name):
         """Save loss function table to csv
@@ -169,10 +319,13 @@ class ContainerWrapper(object):
         :param experiment_name: the name of the controlling Trial object
         :return: None
         """
-        table = self._complete_loss_logs
-        logger.info("Saving logs for container {}".format(self.id))
-        table.to_csv("{}_{}.csv".format(experiment_name, self.id), index=False)
+        with tracer.span('save_logs', c_id=self.id):
+            table = self.final_loss_logs()
+            logger.info("Saving logs for container {}".format(self.id))
+            table.to_csv("{}_{}.csv".format(experiment_name, self.id), index=False)
 
     def kill(self):
-        """Kill the container controlled by self"""
-        subprocess.run(['docker', 'container', 'kill', self.id], stdout=DEVNULL)
+        """Kill the container controlled by self, resuming it first if it is paused"""
+        self.frozen = False
+        with tracer.span('docker kill', c_id=self.id):
+            subprocess.run(['docker', 'container', 'kill', self.id], stdout=DEVNULL)
@@ -0,0 +1,49 @@
+"""Time-slicing of converged containers with `docker pause`
+
+Squeezing a completing container to its minimum share still leaves it competing with the growing containers for
+caches and memory bandwidth. When a Freezer runs after the policy on each tick of a Trial, only `slots` of the
+completing containers run at a time and the rest are paused with the cgroup freezer. The running slots rotate
+round-robin from tick to tick, so every converged job keeps moving towards completion, and all of them are resumed
+as soon as there are no growing containers left to protect.
+"""
+
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class Freezer(object):
+    """Pause all but `slots` of the completing containers while other containers are still growing"""
+
+    def __init__(self, slots=1):
+        """
+        :param slots: number of completing containers left running on each tick
+        """
+        self.slots = slots
+        self._turn = 0
+
+    def run(self, containers):
+        """Freeze and thaw the containers of a ContainerList according to their completing marks
+
+        :param containers: the ContainerList for the session
+        :return: None
+        """
+        converged = [c for c in containers if c.completing]
+        growing = len(containers) - len(converged)
+
+        if growing == 0 or len(converged) <= self.slots:
+            running = converged
+        else:
+            start = self._turn % len(converged)
+            running = (converged[start:] + converged[:start])[:self.slots]
+            self._turn = start + self.slots
+            logger.info("Freezer: running {} of {} completing containers".format(
+                [c.id for c in running], len(converged)))
+
+        # Thaw before freezing, so that the host is never left with fewer running containers than it needs
+        for c in containers:
+            if c.frozen and (not c.completing or c in running):
+                c.frozen = False
+        for c in converged:
+            if not c.frozen and c not in running:
+                c.frozen = True
@@ -3,6 +3,7 @@ import logging
 import utils
 from app.repeated_timer import RepeatedTimer
 from app.algorithm import *
+from app.tracer import tracer
 
 logger = utils.get_logger(__name__)
 
@@ -28,6 +29,7 @@ class BackoffListener(object):
         self.timer.stop()
         self._is_running = False
 
+    @tracer.traced('BackoffListener.listen')
     def listen(self):
         logger.info("running BackoffListener.listen()")
         current_active = utils.get_active_containers()
@@ -0,0 +1,156 @@
+"""Sources of container log lines for ContainerWrapper
+
+By default a ContainerWrapper parses the output of `docker logs`, which makes the daemon re-serialize the whole log
+on every call. JsonFileLogSource instead reads the json-file log driver's files straight off disk: each file is
+memory-mapped and only the bytes appended since the previous read are scanned, so the cost of a tick is
+proportional to the new output rather than to the age of the container.
+
+Each line written by the json-file driver looks like
+
+    {"log":"Loss: 0.231 Time: 1537892312.11\\n","stream":"stdout","time":"2018-09-25T16:18:32.110Z"}
+
+The loss and time patterns are searched for directly in the mapped bytes, without decoding the JSON. Lines written
+to stderr are skipped, so that both sources read the same stream: ContainerWrapper only captures the stdout of
+`docker logs`. Containers that run several jobs tag each line with the job it came from, e.g.
+`Job: vae3 Loss: 0.231 Time: 1537892312.11`; the tag is picked up in the same pass.
+"""
+
+import mmap
+import os
+import re
+import subprocess
+
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+LOSS_PATTERN = re.compile(b'Loss: ([0-9.]+)')
+TIME_PATTERN = re.compile(b'Time: ([0-9.]+)')
+JOB_PATTERN = re.compile(b'Job: ([A-Za-z0-9_.-]+)')
+UNREADABLE = ("Cannot read the container log file {}: run the controller as a user that can read docker's log files, "
+              "or use --log_source docker")
+# Marks a json-file line written to stderr; quotes inside the log text itself are escaped, so this cannot match it
+STDERR_MARKER = b'"stream":"stderr"'
+
+
+def parse_loss_lines(buffer, start=0, end=None, skip=None):
+    """Parse loss and timestamp observations, and the job tag of each, out of newline-separated log lines
+
+    :param buffer: a bytes-like object (bytes, mmap, ...) holding the lines
+    :param start: offset of the first byte to scan
+    :param end: offset one past the last byte to scan; defaults to the length of `buffer`
+    :param skip: optional bytes; lines containing them are ignored
+    :return: a tuple (loss, timestamp, job) of lists; job holds the tag of each observation, or None if untagged
+    """
+    end = len(buffer) if end is None else end
+    loss = []
+    timestamp = []
+    job = []
+    pos = start
+    while pos < end:
+        newline = buffer.find(b'\n', pos, end)
+        line_end = end if newline == -1 else newline
+        if skip is not None and buffer.find(skip, pos, line_end) != -1:
+            pos = line_end + 1
+            continue
+        l = LOSS_PATTERN.search(buffer, pos, line_end)
+        t = TIME_PATTERN.search(buffer, pos, line_end)
+        if l is not None and t is not None:
+            loss.append(float(l.group(1)))
+            timestamp.append(float(t.group(1)))
+            j = JOB_PATTERN.search(buffer, pos, line_end)
+            job.append(None if j is None else j.group(1).decode('ascii'))
+        pos = line_end + 1
+    return loss, timestamp, job
+
+
+class JsonFileLogSource(object):
+    """Incrementally read a container's json-file log from disk
+
+    Keeps the inode and byte offset reached by the previous read. When the driver rotates the log (the file at
+    `path` has a new inode or has shrunk), the remainder of the rotated file `path.1` is read before starting on
+    the new file from the beginning. A trailing partial line is left for the next read.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path to the `<id>-json.log` file
+        """
+        self.path    = path
+        self._inode  = None
+        self._offset = 0
+
+    @classmethod
+    def from_container(cls, id):
+        """Locate the log file of container `id` with `docker inspect`
+
+        Raises ValueError if the container does not log through the json-file driver, which is the only one whose
+        files this can read, and PermissionError if its log file cannot be read.
+        """
+        out = subprocess.check_output(['docker', 'inspect', '--format', '{{.HostConfig.LogConfig.Type}} {{.LogPath}}',
+                                       id])
+        driver, _, path = out.decode('ascii').strip().partition(' ')
+        if driver != 'json-file' or not path:
+            raise ValueError("Container {} logs through the '{}' driver, but --log_source json-file needs the "
+                             "json-file driver; use --log_source docker".format(id, driver))
+        try:
+            with open(path, 'rb'):
+                pass
+        except FileNotFoundError:  # nothing has been logged yet
+            pass
+        except PermissionError as e:
+            raise PermissionError(UNREADABLE.format(path)) from e
+        logger.info("Reading logs for container {} from {}".format(id, path))
+        return cls(path)
+
+    def _scan(self, path, start):
+        """Parse the complete lines of `path` after byte `start`
+
+        :return: a tuple (loss, timestamp, job, offset) where offset is one past the last byte consumed
+        """
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= start:
+                return [], [], [], start
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                end = mm.rfind(b'\n', start, size) + 1
+                if end <= start:
+                    return [], [], [], start
+                loss, timestamp, job = parse_loss_lines(mm, start, end, skip=STDERR_MARKER)
+        return loss, timestamp, job, end
+
+    def read_new(self):
+        """Parse every complete line appended since the previous call
+
+        Raises PermissionError, with a hint, if the log file cannot be read.
+
+        :return: a tuple (loss, timestamp, job) of lists, as returned by parse_loss_lines
+        """
+        try:
+            return self._read_new()
+        except PermissionError as e:
+            raise PermissionError(UNREADABLE.format(self.path)) from e
+
+    def _read_new(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            logger.warning("Log file {} not found".format(self.path))
+            return [], [], []
+
+        loss = []
+        timestamp = []
+        job = []
+        if self._inode is not None and (stat.st_ino != self._inode or stat.st_size < self._offset):
+            logger.info("Log file {} was rotated".format(self.path))
+            rotated = self.path + '.1'
+            try:
+                if os.stat(rotated).st_ino == self._inode:
+                    loss, timestamp, job, _ = self._scan(rotated, self._offset)
+            except FileNotFoundError:
+                pass
+            self._offset = 0
+
+        self._inode = stat.st_ino
+        new_loss, new_timestamp, new_job, self._offset = self._scan(self.path, self._offset)
+        return loss + new_loss, timestamp + new_timestamp, job + new_job
@@ -0,0 +1,314 @@
+"""Allocation policies
+
+A policy looks at a Snapshot of the telemetry of every container, held as one numpy array per quantity, and
+returns an Allocation: the new CPU limit of each container along with its watching and completing marks. Working
+on whole arrays keeps every policy to a handful of vectorized operations per tick, however many containers there
+are. `algorithm.run_policy` builds the Snapshot from a ContainerList and applies the Allocation.
+
+Policies are looked up by name in POLICIES:
+
+    algo_1               algorithm 1 from the paper
+    equal_share          every container gets 1/n of the host
+    max_min_fair         max-min fair shares of the host, with each container's demand taken from its recent CPU use
+    growth_proportional  shares proportional to growth, marking containers completing without a watching interval
+    deadline             algorithm 1 with each container's share weighted by its priority and deadline urgency
+
+Any of them can be wrapped in an IOAwarePolicy, which stops giving CPU to containers that are bound by disk or
+network I/O and sets their blkio weights instead.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+# Docker's blkio weight for containers that were never given one
+DEFAULT_BLKIO_WEIGHT = 500
+
+Snapshot = namedtuple('Snapshot', ['ids', 'growth', 'loss', 'progress', 'ages', 'watching', 'completing', 'limits',
+                                   'cpu_mean', 'io_rate', 'weights', 'slack', 'n_cpus', 'beta'])
+Snapshot.__doc__ = """Telemetry of n containers, one array of length n per field
+
+:param ids: container IDs
+:param growth: growth efficiency as computed by ContainerWrapper.growth
+:param loss: E_i, the mean normalized loss over the last interval
+:param progress: absolute change in loss per second between the last two intervals
+:param ages: seconds since the start of the trial
+:param watching: bool, marked watching by the previous run
+:param completing: bool, marked completing by the previous run
+:param limits: current CPU limits in number of cpus
+:param cpu_mean: mean fraction of the host's CPU used over the last interval, NaN if unknown or not collected
+:param io_rate: block and network I/O over the last interval in bytes per second, NaN if unknown or not collected
+:param weights: job priorities, 1 being the lowest
+:param slack: fraction of the time between a container's creation and its deadline that is left, negative once the
+              deadline has passed and NaN if the container has no deadline
+:param n_cpus: number of cpus on the host
+:param beta: weight for old containers vs new containers
+"""
+
+Allocation = namedtuple('Allocation', ['limits', 'watching', 'completing', 'blkio_weights'], defaults=[None])
+Allocation.__doc__ = """The decisions of a policy for n containers
+
+:param limits: new CPU limits in number of cpus; NaN leaves a container's limit unchanged
+:param watching: bool, new watching marks
+:param completing: bool, new completing marks
+:param blkio_weights: optional new blkio weights in [10, 1000]; None or NaN leaves a container's weight unchanged
+"""
+
+
+class Policy(object):
+    """Base class for allocation policies"""
+
+    name = None
+    # Set to True if `allocate` reads Snapshot.cpu_mean or Snapshot.io_rate, so that they are only collected when needed
+    uses_cpu = False
+    uses_io = False
+
+    def __init__(self, alpha=0.03):
+        """
+        :param alpha: decision threshold for growth efficiency
+        """
+        self.alpha = alpha
+
+    def allocate(self, snapshot):
+        """Decide the limits and marks of every container in `snapshot`
+
+        :param snapshot: a Snapshot
+        :return: an Allocation
+        """
+        raise NotImplementedError
+
+
+class Algo1Policy(Policy):
+    """Algorithm 1 from the paper
+
+    A container whose growth drops below alpha is watched for one interval and then marked completing. Completing
+    containers get their share of the growth sum, but no less than 1/(beta*n) of the host; growing containers get
+    their share of the growth sum; watched containers keep their limit. If every container was already completing,
+    all of them get the whole host.
+    """
+
+    name = 'algo_1'
+
+    def score(self, snapshot):
+        """The quantity that limits are shared in proportion to: growth efficiency"""
+        return snapshot.growth
+
+    def allocate(self, snapshot):
+        n = len(snapshot.ids)
+        watching = snapshot.watching.copy()
+        completing = snapshot.completing.copy()
+        all_completing = completing.all()
+
+        low = snapshot.growth < self.alpha
+        flip = low & ~completing
+        completing[flip] = watching[flip]
+        watching[flip] = ~watching[flip]
+        watching[~low] = False
+        completing[~low] = False
+
+        limits = np.full(n, np.nan)
+        if all_completing and n != 0:
+            limits[:] = snapshot.n_cpus
+        else:
+            score = self.score(snapshot)
+            score_sum = score.sum()
+            if score_sum != 0:
+                ratio = score / score_sum
+                share = np.where(completing, np.maximum(ratio, 1 / (snapshot.beta * n)), np.minimum(ratio, 1))
+                limits = np.where(watching, np.nan, share * snapshot.n_cpus)
+        return Allocation(limits, watching, completing)
+
+
+class EqualSharePolicy(Policy):
+    """Give every container 1/n of the host"""
+
+    name = 'equal_share'
+
+    def allocate(self, snapshot):
+        n = len(snapshot.ids)
+        limits = np.full(n, snapshot.n_cpus / n if n else np.nan)
+        return Allocation(limits, np.zeros(n, dtype=bool), np.zeros(n, dtype=bool))
+
+
+def max_min_fair(demand, capacity=1.0):
+    """Max-min fair (water-filling) shares of `capacity` for the given demands
+
+    Containers demanding less than the fair level get their demand; the rest split what is left equally.
+
+    :param demand: array of demands in the same unit as capacity
+    :param capacity: the total to share
+    :return: array of shares
+    """
+    n = len(demand)
+    if n == 0:
+        return np.zeros(0)
+    sorted_demand = np.sort(demand)
+    satisfied = np.concatenate([[0], np.cumsum(sorted_demand)[:-1]])
+    level = (capacity - satisfied) / (n - np.arange(n))
+    saturated = sorted_demand > level
+    if not saturated.any():
+        return demand.astype(float)
+    return np.minimum(demand, level[np.argmax(saturated)])
+
+
+class MaxMinFairPolicy(Policy):
+    """Share the host max-min fairly, with each container demanding `headroom` times its recent CPU use
+
+    Containers whose recent CPU use is unknown demand the whole host.
+    """
+
+    name = 'max_min_fair'
+    uses_cpu = True
+
+    def __init__(self, alpha=0.03, headroom=1.25):
+        super(MaxMinFairPolicy, self).__init__(alpha)
+        self.headroom = headroom
+
+    def allocate(self, snapshot):
+        n = len(snapshot.ids)
+        demand = np.where(np.isnan(snapshot.cpu_mean), 1.0, snapshot.cpu_mean * self.headroom)
+        limits = max_min_fair(demand) * snapshot.n_cpus
+        return Allocation(limits, np.zeros(n, dtype=bool), np.zeros(n, dtype=bool))
+
+
+class GrowthProportionalPolicy(Policy):
+    """Give each container its share of the growth sum, with no watching interval
+
+    Containers whose growth is below alpha are marked completing straight away; every container gets at least
+    1/(beta*n) of the host. If no container is growing, the host is shared equally.
+    """
+
+    name = 'growth_proportional'
+
+    def allocate(self, snapshot):
+        n = len(snapshot.ids)
+        completing = snapshot.growth < self.alpha
+        growth_sum = snapshot.growth.sum()
+        if n == 0 or growth_sum == 0:
+            limits = np.full(n, snapshot.n_cpus / n if n else np.nan)
+        else:
+            share = np.maximum(snapshot.growth / growth_sum, 1 / (snapshot.beta * n))
+            limits = np.minimum(share, 1) * snapshot.n_cpus
+        return Allocation(limits, np.zeros(n, dtype=bool), completing)
+
+
+class DeadlinePolicy(Algo1Policy):
+    """Algorithm 1, with shares in proportion to growth weighted by priority and deadline urgency
+
+    Watching and completing marks still follow raw growth against alpha. A container's urgency is 1 until its
+    deadline window starts running out, then rises linearly to 1 + `urgency` as the slack reaches zero. Containers
+    without a deadline, or whose deadline has already passed, have an urgency of 1 so that a missed job does not
+    starve the others.
+    """
+
+    name = 'deadline'
+
+    def __init__(self, alpha=0.03, urgency=3.0):
+        """
+        :param urgency: extra weight of a container whose deadline is imminent
+        """
+        super(DeadlinePolicy, self).__init__(alpha)
+        self.urgency = urgency
+
+    def score(self, snapshot):
+        slack = snapshot.slack
+        pending = ~np.isnan(slack) & (slack >= 0)
+        urgency = np.ones(len(slack))
+        urgency[pending] += self.urgency * (1 - np.minimum(slack[pending], 1))
+        return snapshot.growth * snapshot.weights * urgency
+
+
+class IOAwarePolicy(Policy):
+    """Wrap a policy so that containers bound by I/O rather than CPU stop getting CPU they cannot use
+
+    A container is I/O-bound if it moves more than `io_threshold` bytes per second through disk and network while
+    using less than `usage_fraction` of the limit the wrapped policy would give it, and less than `saturation` of
+    its current limit. Testing against the wrapped policy's limit rather than the current one keeps a container
+    I/O-bound once it has been capped, until it uses nearly all of its cap. Its limit from the wrapped policy is
+    capped at `headroom`
+    times the cpus it actually uses (but at least one cpu, since limits are applied in whole cpus), and the CPU
+    freed that way goes to the other containers in proportion to their limits. I/O-bound containers also get a
+    blkio weight: from 100 up to 1000 in proportion to growth while growing, and the minimum of 10 once completing
+    so that they stop competing for the disk. Every other container is given docker's default weight back, so that
+    a weight set while a container was I/O-bound does not outlive it. Docker applies the weight as io.weight on
+    cgroup v2 hosts.
+
+    Network bandwidth counts towards being I/O-bound, but is not throttled.
+    """
+
+    uses_cpu = True
+    uses_io = True
+
+    def __init__(self, policy, io_threshold=5e6, usage_fraction=0.5, headroom=1.5, saturation=0.9):
+        """
+        :param policy: the Policy to wrap
+        :param io_threshold: bytes per second of I/O above which a container may be I/O-bound
+        :param usage_fraction: fraction of the wrapped policy's CPU limit below which an I/O-heavy container is
+                               I/O-bound
+        :param headroom: multiple of its CPU use that an I/O-bound container's limit is capped at
+        :param saturation: fraction of its current CPU limit above which a container is CPU-bound after all
+        """
+        self.policy         = policy
+        self.name           = policy.name + '+io'
+        self.io_threshold   = io_threshold
+        self.usage_fraction = usage_fraction
+        self.headroom       = headroom
+        self.saturation     = saturation
+
+    @property
+    def alpha(self):
+        return self.policy.alpha
+
+    @alpha.setter
+    def alpha(self, alpha):
+        self.policy.alpha = alpha
+
+    def io_bound(self, snapshot, target):
+        """Boolean array of the containers in `snapshot` that are bound by I/O rather than CPU
+
+        :param target: the CPU limits the wrapped policy gives the containers; NaN, for a limit left unchanged, is
+                       not compared against
+        """
+        used = snapshot.cpu_mean * snapshot.n_cpus
+        with np.errstate(invalid='ignore'):
+            return (snapshot.io_rate > self.io_threshold) & (np.isnan(target) | (used < self.usage_fraction * target)) \
+                   & (used < self.saturation * snapshot.limits)
+
+    def allocate(self, snapshot):
+        allocation = self.policy.allocate(snapshot)
+        limits = allocation.limits.copy()
+        bound = self.io_bound(snapshot, limits)
+        weights = np.full(len(limits), DEFAULT_BLKIO_WEIGHT, dtype=float)
+        if not bound.any():
+            return Allocation(limits, allocation.watching, allocation.completing, weights)
+
+        target = np.where(np.isnan(limits), snapshot.limits, limits)
+        cap = np.maximum(snapshot.cpu_mean * snapshot.n_cpus * self.headroom, 1)
+        capped = bound & (target > cap)
+        freed = (target[capped] - cap[capped]).sum()
+        limits[capped] = cap[capped]
+
+        others = ~bound & ~np.isnan(limits)
+        if freed > 0 and limits[others].sum() > 0:
+            limits[others] += freed * limits[others] / limits[others].sum()
+            limits[others] = np.minimum(limits[others], snapshot.n_cpus)
+
+        growth_max = snapshot.growth[bound].max()
+        scale = snapshot.growth / growth_max if growth_max > 0 else np.zeros(len(limits))
+        weights[bound] = np.where(allocation.completing[bound], 10, np.round(100 + 900 * scale[bound]))
+        return Allocation(limits, allocation.watching, allocation.completing, weights)
+
+
+POLICIES = {policy.name: policy for policy in [Algo1Policy, EqualSharePolicy, MaxMinFairPolicy,
+                                               GrowthProportionalPolicy, DeadlinePolicy]}
+
+
+def make_policy(name, alpha=0.03):
+    """Create the policy called `name`
+
+    :param name: a key of POLICIES
+    :param alpha: decision threshold for growth efficiency
+    """
+    if name not in POLICIES:
+        raise ValueError("Unknown policy '{}', choose from {}".format(name, sorted(POLICIES)))
+    return POLICIES[name](alpha=alpha)
@@ -4,6 +4,7 @@
 from threading import Timer
 import logging
 
+from app.tracer import tracer
 from utils import get_logger
 
 logger = get_logger(__name__)
@@ -36,7 +37,8 @@ class RepeatedTimer(object):
         logger.info("Executing RepeatedTimer._run with function: {}".format(self.function.__name__))
         self.is_running = False
         self.start()
-        self.function(*self.args, **self.kwargs)
+        with tracer.span('RepeatedTimer._run', function=self.function.__name__, interval=self.interval):
+            self.function(*self.args, **self.kwargs)
 
     def start(self):
         logger.info("Starting RepeatedTimer._timer")
@@ -44,8 +46,10 @@ class RepeatedTimer(object):
             self._timer = Timer(self.interval, self._run)
             self._timer.start()
             self.is_running = True
+            tracer.instant('RepeatedTimer.start', function=self.function.__name__, interval=self.interval)
 
     def stop(self):
         logger.info("Stopping RepeatedTimer._Timer object")
         self._timer.cancel()
         self.is_running = False
+        tracer.instant('RepeatedTimer.stop', function=self.function.__name__, interval=self.interval)
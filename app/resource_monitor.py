@@ -11,6 +11,7 @@
 
     TODO we need to tune alpha and time interval for each model
 """
+import os
 import re
 import subprocess
 import time
@@ -20,11 +21,24 @@ import logging
 
 import pandas as pd
 
+import utils
 from app.repeated_timer import RepeatedTimer
+from app.tracer import tracer
 from utils import get_logger
 
 logger = get_logger(__name__)
 
+# Multipliers for the size units printed by `docker stats`
+UNITS = {'B': 1, 'kB': 1e3, 'KB': 1e3, 'MB': 1e6, 'GB': 1e9, 'TB': 1e12,
+         'KiB': 2 ** 10, 'MiB': 2 ** 20, 'GiB': 2 ** 30, 'TiB': 2 ** 40}
+IO_COLUMNS = ['block_in', 'block_out', 'net_in', 'net_out']
+
+
+def to_bytes(sizes):
+    """Convert a pd.Series of sizes as printed by `docker stats`, e.g. '12.3MB' or '0B', to a float Series of bytes"""
+    parts = sizes.str.extract('([0-9.]+)([A-Za-z]*)', expand=True)
+    return parts[0].astype(float) * parts[1].map(UNITS).fillna(1)
+
 
 class ResourceMonitor(object):
     """An object that maintains a table of docker resource usage statistics
@@ -32,21 +46,62 @@ class ResourceMonitor(object):
     Meant to be used as a singleton.
 
     Runs `docker stats --no-stream` every n seconds using a RepeatedTimer object, accumulating results into a DataFrame
+
+    If given a `cpu_budget`, the monitor samples adaptively instead: every `update_interval` seconds it only samples
+    the containers that are due. A container is due every `update_interval` seconds while it is new or its CPU use is
+    changing quickly, and `stable_factor` times less often once the Trial has marked it completing and its CPU use is
+    steady. On top of that, all intervals are stretched while the controller's own CPU use (including the docker
+    subprocesses it waits on) is above the budget and shrunk back once it is well below, but never beyond
+    `max_interval` so that every algorithm interval still sees a sample of every container.
     """
 
-    def __init__(self, update_interval=10):
+    def __init__(self, update_interval=10, cpu_budget=None, max_interval=None, stable_factor=4, warmup=3,
+                 change_threshold=0.05):
         """
         :param update_interval: how frequently, in seconds, to update docker stats table
+        :param cpu_budget: controller CPU use to stay within, in cpus (e.g. 0.05); None samples every container at
+                           every update
+        :param max_interval: longest interval, in seconds, between two samples of a container when sampling
+                             adaptively; at most the algorithm interval minus `update_interval`, so that every
+                             algorithm interval sees a sample
+        :param stable_factor: how many times less often stable containers are sampled
+        :param warmup: number of samples of a new container taken at `update_interval` regardless of the budget
+        :param change_threshold: change in a container's share of the host CPU between two samples above which it is
+                                 considered fast-changing
         """
-        logger.info('Initializing ResourceMonitor with update interval = {}'.format(update_interval))
+        logger.info('Initializing ResourceMonitor with update interval = {}, cpu budget = {}'
+                    .format(update_interval, cpu_budget))
         self.history = self._check_stats()
         self._update_interval = update_interval
         self._timer = RepeatedTimer(interval=self._update_interval, function=self._update)
 
+        self.cpu_budget       = cpu_budget
+        self.max_interval     = max_interval if max_interval is not None else 8 * update_interval
+        self.stable_factor    = stable_factor
+        self.warmup           = warmup
+        self.change_threshold = change_threshold
+        self.overhead         = []  # one record per adaptive update, see self._adjust
+        self._scale           = 1.0
+        self._samples         = {}  # container id -> number of samples taken
+        self._last_sampled    = {}
+        self._last_cpu        = {}
+        self._changing        = {}
+        self._stable          = {}
+        self._last_cpu_time   = self._cpu_time()
+        self._last_wall_time  = time.time()
+
     @staticmethod
-    def _check_stats():
+    def _cpu_time():
+        """CPU seconds used by this process and the subprocesses it has waited on"""
+        t = os.times()
+        return t.user + t.system + t.children_user + t.children_system
+
+    @staticmethod
+    def _check_stats(ids=()):
         """Run `docker stats --no-stream` and parse into pd.DataFrame
 
+        :param ids: only sample these containers; all running containers if empty
+
         TODO the columns printed vary with docker versions... standardize this somehow.
         TODO note: had to install docker version 17 and anaconda on chameleon for this to work
         """
@@ -55,7 +110,8 @@ class ResourceMonitor(object):
         columns = ['container_id', 'cpu_pct', 'mem_use', 'mem_max',
                    'mem_pct', 'net_in', 'net_out', 'block_in', 'block_out', 'pids']
 
-        records = subprocess.check_output(['docker', 'stats', '--no-stream']).decode('ascii')
+        with tracer.span('docker stats', containers=len(ids)):
+            records = subprocess.check_output(['docker', 'stats', '--no-stream'] + list(ids)).decode('ascii')
         records = records.split('\n')[1:-1]  # exclude headers and trailing empty string
         records = [re.split('[ /]+', record) for record in records]
 
@@ -85,12 +141,90 @@ class ResourceMonitor(object):
         resources['mem_norm'] = resources.mem_pct.str.rstrip('%').astype(float) / 100
         return resources.cpu_norm.mean()
 
+    def io_rate(self, id, interval):
+        """
+        Calculates the block and network I/O rate of a container over the last interval from the cumulative
+        counters in self.history
+        :param id:
+        :param interval:
+        :return: bytes per second read and written to disk and network, or None with fewer than two samples
+        """
+        resources = self.history[self.history.container_id == id]
+        resources = resources[resources.time >= (time.time() - interval)]
+        if len(resources) < 2:
+            return None
+
+        total = sum(to_bytes(resources[col]) for col in IO_COLUMNS)
+        elapsed = resources.time.iloc[-1] - resources.time.iloc[0]
+        if elapsed <= 0:
+            return None
+        return max(total.iloc[-1] - total.iloc[0], 0) / elapsed
+
     def start(self):
         self._timer.start()
 
     def _update(self):
         """Run self._check_stats() and concatenate to self.history"""
-        self.history = pd.concat([self.history, self._check_stats()], ignore_index=True)
+        if self.cpu_budget is None:
+            self.history = pd.concat([self.history, self._check_stats()], ignore_index=True)
+            return
+
+        now = time.time()
+        active = utils.get_active_containers()
+        # Copy the keys first: Trial.run adds to self._stable through set_stable from another thread
+        for table in (self._samples, self._last_sampled, self._last_cpu, self._changing, self._stable):
+            for c_id in [c_id for c_id in list(table) if c_id not in active]:
+                table.pop(c_id, None)
+
+        # Half a tick of slack so that intervals that are multiples of the tick are not pushed back by jitter
+        due = [c_id for c_id in active
+               if now - self._last_sampled.get(c_id, 0) >= self.sample_interval(c_id) - self._update_interval / 2]
+        if due:
+            try:
+                stats = self._check_stats(due)
+            except subprocess.CalledProcessError:  # a container exited between `docker ps` and `docker stats`
+                logger.warning('ResourceMonitor: docker stats failed for {}'.format(due))
+            else:
+                self.history = pd.concat([self.history, stats], ignore_index=True)
+                cpu_norm = stats.cpu_pct.str.rstrip('%').astype(float) / cpu_count() / 100
+                for c_id, cpu in zip(stats.container_id, cpu_norm):
+                    if c_id in self._last_cpu:
+                        self._changing[c_id] = abs(cpu - self._last_cpu[c_id]) > self.change_threshold
+                    self._last_cpu[c_id] = cpu
+                    self._samples[c_id] = self._samples.get(c_id, 0) + 1
+                    self._last_sampled[c_id] = now
+
+        self._adjust(now, len(active), len(due))
+
+    def _adjust(self, now, num_active, num_sampled):
+        """Stretch or shrink the sampling intervals to keep the controller's CPU use within self.cpu_budget"""
+        cpu_time = self._cpu_time()
+        overhead = (cpu_time - self._last_cpu_time) / max(now - self._last_wall_time, 1e-6)
+        self._last_cpu_time = cpu_time
+        self._last_wall_time = now
+
+        if overhead > self.cpu_budget:
+            self._scale = min(self._scale * 1.5, self.max_interval / self._update_interval)
+        elif overhead < self.cpu_budget / 2:
+            self._scale = max(self._scale / 1.25, 1.0)
+
+        logger.info('ResourceMonitor: overhead = {:.3f} cpus, sampled {} of {} containers, interval scale = {:.2f}'
+                    .format(overhead, num_sampled, num_active, self._scale))
+        self.overhead.append(dict(time=now, overhead=overhead, num_active=num_active, num_sampled=num_sampled,
+                                  scale=self._scale))
+
+    def sample_interval(self, id):
+        """The current number of seconds between two samples of container `id` when sampling adaptively"""
+        if self._samples.get(id, 0) < self.warmup:
+            return self._update_interval
+        interval = self._update_interval * self._scale
+        if self._stable.get(id, False) and not self._changing.get(id, True):
+            interval *= self.stable_factor
+        return min(interval, self.max_interval)
+
+    def set_stable(self, id, stable):
+        """Hint whether container `id` is stable (e.g. marked completing), and can be sampled less often"""
+        self._stable[id] = stable
 
     def stop(self):
         """Stop the RepeatedTimer thread"""
@@ -104,3 +238,5 @@ class ResourceMonitor(object):
         """
         logger.info("Writing ResourceMonitor table to csv")
         self.history.to_csv("{}_docker_stats.csv".format(experiment_name), index=False)
+        if self.overhead:
+            pd.DataFrame(self.overhead).to_csv("{}_monitor_overhead.csv".format(experiment_name), index=False)
@@ -0,0 +1,196 @@
+"""Shadow policies: run alternative policies and configurations alongside the live one
+
+A ShadowPolicy runs an allocation policy (algorithm 1 by default) on every tick of the Trial with its own alpha,
+beta and interval, but over ShadowContainers rather than the real ContainerWrappers: the watching/completing marks
+and CPU limits it decides on are recorded in its own status table and never applied. All shadows share the loss
+history parsed by the live ContainerWrappers and the ResourceMonitor's stats table, so each one costs a few pandas
+operations per container per tick rather than another round of `docker logs` and `docker stats`.
+"""
+
+import time
+from multiprocessing import cpu_count
+
+import numpy as np
+import pandas as pd
+
+from app.algorithm import run_policy
+from app.policies import POLICIES, make_policy
+from app.container_wrapper import interval_loss, job_interval_loss, job_progress
+from app.tracer import tracer
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+# A loss history parsed less than this many seconds ago is reused rather than read again
+FRESHNESS = 5
+# A shadow runs on a live tick if at least its interval minus this many seconds has passed since its last run
+TOLERANCE = 2.0
+
+
+class ShadowContainer(object):
+    """Stand-in for a ContainerWrapper that a ShadowPolicy can mark and limit without touching the container"""
+
+    def __init__(self, wrapper, interval):
+        """
+        :param wrapper: the live ContainerWrapper whose telemetry is shared
+        :param interval: the shadow policy's interval
+        """
+        self.wrapper      = wrapper
+        self.id           = wrapper.id
+        self.interval     = interval
+        self.watching     = None
+        self.completing   = None
+        self.cpu_lim      = cpu_count()
+        self.E_i          = np.nan
+        self.E_i_minus_1  = np.nan
+        self.job_progress = None  # sum of the jobs' progress if the wrapper runs several jobs
+
+    def refresh(self, now):
+        """Recompute E_i and E_i_minus_1 over the shadow's interval from the wrapper's loss history"""
+        history = self.wrapper.loss_logs(FRESHNESS)
+        if self.wrapper.njobs == 1:
+            self.E_i, self.E_i_minus_1 = interval_loss(history, now, self.interval)
+        else:
+            jobs = job_interval_loss(history, now, self.interval)
+            self.E_i, self.E_i_minus_1 = jobs['E_i'].mean(), jobs['E_i_minus_1'].mean()
+            self.job_progress = job_progress(jobs, self.interval).sum()
+
+    @property
+    def age(self):
+        return self.wrapper.age
+
+    @property
+    def priority(self):
+        return self.wrapper.priority
+
+    @property
+    def slack(self):
+        return self.wrapper.slack
+
+    @property
+    def progress(self):
+        if self.job_progress is not None:
+            return self.job_progress
+        if np.isnan(self.E_i_minus_1) or np.isnan(self.E_i):
+            return 0
+        return abs(self.E_i - self.E_i_minus_1) / self.interval
+
+    def growth(self, monitor):
+        if self.wrapper.frozen or np.isnan(self.E_i_minus_1):
+            return 0
+        cpu_mean = monitor.cpu_mean(self.id, self.interval)
+        if cpu_mean is None:
+            return 0
+        return self.progress / cpu_mean
+
+
+class ShadowContainerList(object):
+    """The subset of the ContainerList interface that run_policy uses, over ShadowContainers"""
+
+    def __init__(self, containers):
+        self.containers = containers
+
+    def __iter__(self):
+        return iter(self.containers)
+
+    def __len__(self):
+        return len(self.containers)
+
+    @property
+    def num_completing(self):
+        return sum(1 for c in self if c.completing)
+
+    @property
+    def num_watching(self):
+        return sum(1 for c in self if c.watching)
+
+
+class ShadowPolicy(object):
+    """Run a policy with its own parameters over the live containers, recording but never applying its decisions"""
+
+    def __init__(self, alpha, interval, beta=None, name=None, policy='algo_1'):
+        """
+        :param policy: name of the allocation policy, one of policies.POLICIES
+        :param alpha: decision threshold for growth efficiency
+        :param interval: interval, in seconds, over which loss is averaged and at which the shadow runs
+        :param beta: weight for old containers vs new containers; if None, 1 + 1/n as in the live Trial
+        :param name: used in the status table and file name; derived from the parameters if None
+        """
+        self.policy     = make_policy(policy, alpha)
+        self.alpha      = alpha
+        self.interval   = interval
+        self.beta       = beta
+        self.name       = name or ("" if policy == 'algo_1' else policy + "_") + \
+                          "a{:g}_i{:g}".format(alpha, interval) + ("" if beta is None else "_b{:g}".format(beta))
+        self.shadows    = {}
+        self.status     = None
+        self.iter_num   = 0
+        self.last_run   = None
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Create a ShadowPolicy from a string '[POLICY:]ALPHA:INTERVAL[:BETA]', e.g. '0.05:60' or 'equal_share:0:30'"""
+        parts = spec.split(':')
+        policy = 'algo_1'
+        if parts and parts[0] in POLICIES:
+            policy = parts.pop(0)
+        if len(parts) not in (2, 3):
+            raise ValueError("Shadow policies are specified as [POLICY:]ALPHA:INTERVAL[:BETA], got '{}'".format(spec))
+        beta = float(parts[2]) if len(parts) == 3 else None
+        return cls(alpha=float(parts[0]), interval=float(parts[1]), beta=beta, policy=policy)
+
+    def _sync(self, containers):
+        """Track new containers and forget those that have left the ContainerList"""
+        live = {c.id: c for c in containers}
+        for c_id in list(self.shadows):
+            if c_id not in live:
+                del self.shadows[c_id]
+        for c_id, c in live.items():
+            if c_id not in self.shadows:
+                self.shadows[c_id] = ShadowContainer(c, self.interval)
+
+    def run(self, containers, monitor):
+        """Run algorithm 1 over shadows of `containers` if the shadow's interval has elapsed
+
+        :param containers: the Trial's ContainerList
+        :param monitor: the Trial's ResourceMonitor
+        :return: the status table of this run, or None if the shadow was not due
+        """
+        now = time.time()
+        if self.last_run is not None and now - self.last_run < self.interval - TOLERANCE:
+            return None
+
+        self._sync(containers)
+        if len(self.shadows) == 0:
+            return None
+
+        logger.info("Running shadow policy {}".format(self.name))
+        with tracer.span('ShadowPolicy.run', shadow=self.name):
+            for shadow in self.shadows.values():
+                shadow.refresh(now)
+
+            shadows = ShadowContainerList(list(self.shadows.values()))
+            beta = self.beta if self.beta is not None else 1 + 1/len(shadows)
+            status = run_policy(self.policy, shadows, monitor, beta=beta, interval=self.interval,
+                                last_run=self.last_run)
+        self.last_run = now
+
+        status.insert(2, 'iter', self.iter_num)
+        self.iter_num += 1
+        status['shadow'] = self.name
+
+        if self.status is None:
+            self.status = status
+        else:
+            self.status = pd.concat([self.status, status])
+        return status
+
+    def to_csv(self, experiment_name):
+        """Save self.status to a csv
+
+        :param experiment_name: the name of the controlling Trial instance
+        :return: None
+        """
+        if self.status is not None:
+            logger.info("Writing shadow policy {} records to csv".format(self.name))
+            self.status.to_csv('{}_shadow_{}_iters.csv'.format(experiment_name, self.name), index=False)
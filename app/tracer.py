@@ -0,0 +1,118 @@
+"""Timeline tracing of the controller in Chrome trace-event format
+
+`tracer` is a module-level singleton which is disabled by default. Once enabled, `tracer.span(name, **args)`
+records a complete ('X') event with the calling thread, start time and duration of the block it wraps, and
+`tracer.instant(name, **args)` records a point-in-time ('i') event. The events are written by `to_json` as a
+JSON object that chrome://tracing and https://ui.perfetto.dev open directly.
+
+While disabled, `span` returns a shared no-op context manager, so instrumented code pays for one attribute
+lookup and one call.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class _NullSpan(object):
+    """Context manager that does nothing, returned by Tracer.span when tracing is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span(object):
+    """Context manager that records one complete event on exit"""
+
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name   = name
+        self.args   = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.tracer._record(dict(name=self.name, ph='X', ts=self.tracer._us(self.start),
+                                 dur=(end - self.start) * 1e6, args=self.args))
+        return False
+
+
+class Tracer(object):
+    """Collect trace events from every thread of the controller"""
+
+    def __init__(self):
+        self.enabled  = False
+        self.events   = []
+        self._threads = {}
+        self._origin  = time.perf_counter()
+        self._pid     = os.getpid()
+
+    def enable(self):
+        logger.info("Enabling timeline tracing")
+        self._origin = time.perf_counter()
+        self.enabled = True
+
+    def _us(self, t):
+        return (t - self._origin) * 1e6
+
+    def _record(self, event):
+        thread = threading.current_thread()
+        event['pid'] = self._pid
+        event['tid'] = thread.ident
+        self._threads[thread.ident] = thread.name
+        self.events.append(event)  # list.append is atomic, so no lock is needed across timer threads
+
+    def span(self, name, **args):
+        """Time the enclosed block as an event called `name`, with `args` shown alongside it"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def instant(self, name, **args):
+        """Record a point-in-time event called `name`"""
+        if self.enabled:
+            self._record(dict(name=name, ph='i', s='t', ts=self._us(time.perf_counter()), args=args))
+
+    def traced(self, name):
+        """Decorator wrapping every call of a function in a span called `name`"""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def to_json(self, experiment_name):
+        """Save the recorded events to `<experiment_name>_trace.json`
+
+        :param experiment_name: the name of the controlling Trial instance
+        :return: None
+        """
+        if not self.enabled:
+            return
+        logger.info("Writing {} trace events to json".format(len(self.events)))
+        names = [dict(name='thread_name', ph='M', pid=self._pid, tid=tid, args=dict(name=name))
+                 for tid, name in list(self._threads.items())]
+        with open('{}_trace.json'.format(experiment_name), 'w') as f:
+            json.dump(dict(traceEvents=names + list(self.events), displayTimeUnit='ms'), f)
+
+
+tracer = Tracer()
@@ -10,16 +10,18 @@ to accumulate.
 """
 
 import glob
-import os
-import shutil
 import sys
-import zipfile
 import logging
 
 from app.algorithm import *
+from app.archiver import LogArchiver
 from app.container_list import ContainerList
+from app.freezer import Freezer
 from app.listener import BackoffListener
+from app.policies import IOAwarePolicy, make_policy
 from app.repeated_timer import *
+from app.tracer import tracer
+from app.tuner import Tuner
 from utils import get_logger
 
 logger = get_logger(__name__)
@@ -38,26 +40,58 @@ class Trial(object):
     """
 
     def __init__(self, alpha, name, interval, start_time, stats_interval, no_algo=False, no_update=False,
-                 no_backoff=False, beta=1.2):
+                 no_backoff=False, beta=1.2, log_source='docker', shadows=(), trace=False, policy='algo_1',
+                 stats_cpu_budget=None, autotune=False, alpha_bounds=(0.005, 0.2), interval_bounds=(10, 120),
+                 io_aware=False, freeze=False, freeze_slots=1):
         """
         :param interval: the interval at which to run algorithm 1
         :param alpha: alpha for altorithm 1
         :param name: A name for the experiment Trial, passed as a command line arg.
         :param stats_interval: number of seconds between calls to docker stats: passed to ResourceMonitor
+        :param log_source: how container logs are read, 'docker' or 'json-file': passed to ContainerList
+        :param shadows: ShadowPolicy objects to run alongside the live algorithm without applying their decisions
+        :param trace: record a timeline of controller operations and save it with the logs as `<name>_trace.json`
+        :param policy: name of the allocation policy to run, one of policies.POLICIES
+        :param stats_cpu_budget: if given, sample docker stats adaptively to keep the controller's CPU use within
+                                 this many cpus: passed to ResourceMonitor
+        :param autotune: adjust alpha and interval between ticks to improve loss reduction per CPU-second
+        :param alpha_bounds: (low, high) bounds for alpha when autotuning: passed to Tuner
+        :param interval_bounds: (low, high) bounds for interval when autotuning: passed to Tuner. The low bound is
+                                raised to at least 2 * stats_interval, so that every interval has two docker stats
+                                samples of each container
+        :param io_aware: wrap the policy in an IOAwarePolicy, which caps the CPU of I/O-bound containers and sets
+                         blkio weights
+        :param freeze: pause completing containers while others are growing, running `freeze_slots` of them at a
+                       time in turn: see Freezer
         """
 
+        if trace:
+            tracer.enable()
+
+        if autotune and interval_bounds[0] < 2 * stats_interval:
+            logger.warning("Raising the lower interval bound from {} to 2 * stats_interval = {}"
+                           .format(interval_bounds[0], 2 * stats_interval))
+            interval_bounds = (2 * stats_interval, max(interval_bounds[1], 2 * stats_interval))
+
         if glob.glob('./{}*.zip'.format(name)):
             raise ValueError("Logs zip for an experiment with name '{}' already exists, ".format(name) +
                              "please use unique experiment names")
 
         self.interval                = interval
         self.alpha                   = alpha
+        self.policy                  = make_policy(policy, alpha)
+        if io_aware:
+            self.policy              = IOAwarePolicy(self.policy)
         self.beta                    = beta
         self.name                    = name
-        self.monitor                 = ResourceMonitor(stats_interval)
-        self.containers              = ContainerList(trial_start=start_time, interval=interval)
+        self.archiver                = LogArchiver(name)
+        self.monitor                 = ResourceMonitor(stats_interval, cpu_budget=stats_cpu_budget,
+                                                       max_interval=max(interval - stats_interval, stats_interval))
+        self.containers              = ContainerList(trial_start=start_time, interval=interval,
+                                                     log_source=log_source, archiver=self.archiver)
         self.containers.no_update    = no_update
         self.status                  = None
+        self.job_status              = None  # per-job status of containers running several jobs
         self.interval                = interval
         self.backoff_interval        = interval  # for the exponential backoff
         self.stats_interval          = stats_interval
@@ -69,10 +103,15 @@ class Trial(object):
         self.listener                = BackoffListener(self)
         self.timer                   = RepeatedTimer(self.interval, self.run)
         self.last_run                = None  # for computing s_since_last_run inside of algo_1
+        self.shadows                 = list(shadows)
+        self.tuner                   = Tuner(alpha, interval, alpha_bounds=alpha_bounds,
+                                             interval_bounds=interval_bounds) if autotune else None
+        self.freezer                 = Freezer(freeze_slots) if freeze else None
 
-        logger.info("Created Trial object with parameters name = {}, alpha = {}, beta={}, interval = {},"\
-                    .format(name, alpha, beta, interval))
+        logger.info("Created Trial object with parameters name = {}, policy = {}, alpha = {}, beta={}, interval = {},"\
+                    .format(name, policy, alpha, beta, interval))
 
+    @tracer.traced('Trial.backoff')
     def backoff(self):
         if self.no_backoff:
             return
@@ -83,6 +122,7 @@ class Trial(object):
         self.timer.start()
         self.listener.start()
 
+    @tracer.traced('Trial.stop_backoff')
     def stop_backoff(self):
         if self.no_backoff:
             return
@@ -95,6 +135,33 @@ class Trial(object):
         self.timer = RepeatedTimer(self.interval, self.run)
         self.timer.start()
 
+    @tracer.traced('Trial.retune')
+    def retune(self, alpha, interval):
+        """Switch to a new alpha and interval, as chosen by self.tuner
+
+        The interval is passed on to the ContainerList, each ContainerWrapper and the ResourceMonitor. Unless the
+        Trial is backing off, the timer is restarted at the new interval; otherwise stop_backoff will pick it up.
+        """
+        logger.info("Retuning alpha from {} to {} and interval from {} to {}"
+                    .format(self.alpha, alpha, self.interval, interval))
+        self.alpha = alpha
+        self.policy.alpha = alpha
+        if interval == self.interval:
+            return
+
+        backing_off = self.backoff_interval != self.interval
+        self.interval = interval
+        self.containers.interval = interval
+        for c in self.containers:
+            c.interval = interval
+        self.monitor.max_interval = max(interval - self.stats_interval, self.stats_interval)
+        if not backing_off:
+            self.backoff_interval = interval
+            self.timer.stop()
+            self.timer = RepeatedTimer(self.interval, self.run)
+            self.timer.start()
+
+    @tracer.traced('Trial.run')
     def run(self):
         """The main procedure of an Trial
 
@@ -121,13 +188,37 @@ class Trial(object):
         self.containers.reconcile(experiment_name=self.name)
         if not self.no_algo and len(self.containers) > 0:
             beta = 1 + 1/len(self.containers)
-            status = algo_1(self.containers, self.monitor, alpha=self.alpha, beta=beta, interval=self.interval,
-                            last_run=self.last_run)
+            tick = time.time()
+            status = run_policy(self.policy, self.containers, self.monitor, beta=beta, interval=self.interval,
+                                last_run=self.last_run)
             self.last_run = time.time()
 
             status.insert(2, 'iter', self.iter_num)
+            # A container's jobs are only recomputed once per interval of its own, so skip those that were not
+            jobs = [c.jobs.reset_index().assign(time=c.jobs_updated, iter=self.iter_num, c_id=c.id)
+                    for c in self.containers if c.jobs is not None and c.jobs_updated >= tick]
+            if jobs:
+                self.job_status = pd.concat([self.job_status] + jobs)
             self.iter_num += 1
             status['backoff_interval'] = self.backoff_interval
+            status['alpha'] = self.alpha
+            status['interval'] = self.interval
+
+            if self.tuner is not None:
+                objective = self.tuner.objective(status, self.monitor, self.interval)
+                change = self.tuner.observe(objective)
+                status['objective'] = objective
+                status['tuned'] = change is not None
+                if change is not None:
+                    self.retune(**change)
+
+            if self.freezer is not None:
+                self.freezer.run(self.containers)
+                status['frozen'] = [c.frozen for c in self.containers]
+                status['frozen_time'] = [c.frozen_time for c in self.containers]
+
+            for c in self.containers:
+                self.monitor.set_stable(c.id, bool(c.completing))
             
             print(status)
 
@@ -139,6 +230,10 @@ class Trial(object):
             if self.containers.all_completing and not self.no_backoff:
                 self.backoff()
 
+        if len(self.containers) > 0:
+            for shadow in self.shadows:
+                shadow.run(self.containers, self.monitor)
+
         self.containers.reconcile(experiment_name=self.name)
 
         if len(self.containers) == 0:
@@ -148,7 +243,16 @@ class Trial(object):
         logger.info("Writing Trial records to CSV")
         if not self.no_algo:
             self.status.to_csv('{}_algo_1_iters.csv'.format(self.name), index=False)
+        if self.job_status is not None:
+            self.job_status.to_csv('{}_jobs.csv'.format(self.name), index=False)
         self.monitor.to_csv(self.name)
+        tracer.to_json(self.name)
+        for shadow in self.shadows:
+            shadow.to_csv(self.name)
+        if self.containers.finished:
+            met, total = self.containers.deadlines_met
+            logger.info("{} of {} deadlines met".format(met, total))
+            pd.DataFrame(self.containers.finished).to_csv('{}_deadlines.csv'.format(self.name), index=False)
 
     def start(self):
         self.monitor.start()
@@ -156,6 +260,8 @@ class Trial(object):
 
     def stop(self):
         logger.info('Killing Trial Instance')
+        # Containers that exited since the last tick are recorded as finished, not as killed
+        self.containers.reconcile(experiment_name=self.name)
         self.containers.killall(self.name)
         self.to_csv()
         self.zip_logs()
@@ -164,17 +270,14 @@ class Trial(object):
         sys.exit(0)
 
     def zip_logs(self):
-        """Move all log files to a separate directory, zip them and delete the raw log files"""
-        new_dir = "./{}".format(self.name)
+        """Queue all remaining log files for the trial archive, which deletes the raw files once they are written
+
+        Container logs already queued by the ContainerList are written first or alongside, and FlowCon.log last,
+        once logging has stopped. The archive is closed in the background, so this returns without waiting for any
+        of it.
+        """
         logger.info("Zipping Trial records")
-        os.makedirs(new_dir)
-        shutil.move("FlowCon.log", new_dir)
         for file in glob.glob("{}*".format(self.name)):
-            shutil.move(file, new_dir)
-
-        with zipfile.ZipFile('{}_logs.zip'.format(self.name), 'w', zipfile.ZIP_DEFLATED) as zf:
-            for root, dirs, files in os.walk(new_dir):
-                for file in files:
-                    zf.write(os.path.join(root, file))
-
-        shutil.rmtree(new_dir)
+            if file != self.archiver.path:
+                self.archiver.submit_file(file)
+        self.archiver.close(log_file="FlowCon.log")
@@ -0,0 +1,132 @@
+"""Online tuning of alpha and interval during a Trial
+
+The Tuner hill-climbs one parameter at a time. After every `epoch` ticks it compares the mean objective of the
+epoch with that of the best setting so far: if it improved, the move is kept and the same parameter is moved again
+in the same direction; if not, the move is undone and the other direction is tried. Once both directions of a
+parameter have failed, its step is halved and the tuner moves on to the other parameter.
+
+The objective of a tick is the total loss reduction per CPU-second across containers: the sum of the containers'
+progress divided by the number of cpus they used on average over the last interval.
+"""
+
+from multiprocessing import cpu_count
+
+import numpy as np
+
+from utils import get_logger
+
+logger = get_logger(__name__)
+
+
+class Tuner(object):
+    """Hill-climb alpha and interval between ticks of a Trial"""
+
+    def __init__(self, alpha, interval, alpha_bounds=(0.005, 0.2), interval_bounds=(10, 120), epoch=2, step=0.5,
+                 min_step=0.05):
+        """
+        :param alpha: starting alpha
+        :param interval: starting interval in seconds
+        :param alpha_bounds: (low, high) bounds that alpha is never moved outside of
+        :param interval_bounds: (low, high) bounds, in seconds, that the interval is never moved outside of
+        :param epoch: number of ticks over which the objective is averaged before each decision
+        :param step: initial relative size of a move, e.g. 0.5 multiplies or divides a parameter by 1.5
+        :param min_step: smallest relative step that a parameter's step is halved down to; the interval always moves
+                         by at least one second
+        """
+        self.params     = dict(alpha=alpha, interval=interval)
+        self.bounds     = dict(alpha=alpha_bounds, interval=interval_bounds)
+        self.steps      = dict(alpha=step, interval=step)
+        self.epoch      = epoch
+        self.min_step   = min_step
+        self._param     = 'alpha'
+        self._direction = 1
+        self._reversed  = False
+        self._previous  = None   # value of self._param before the move being evaluated
+        self._best      = None   # mean objective of the best setting so far
+        self._window    = []
+
+    @staticmethod
+    def objective(status, monitor, interval):
+        """Total loss reduction per CPU-second of the containers in `status`
+
+        :param status: the status table returned by run_policy for this tick
+        :param monitor: the Trial's ResourceMonitor
+        :param interval: the interval over which CPU use is averaged
+        :return: the objective, or None if no container has both progress and CPU use to report
+        """
+        cpu = np.array([monitor.cpu_mean(c_id, interval) for c_id in status.c_id], dtype=float)
+        known = ~np.isnan(cpu)
+        cpu_seconds = cpu[known].sum() * cpu_count()
+        if cpu_seconds == 0:
+            return None
+        return status.progress.values[known].sum() / cpu_seconds
+
+    def _clip(self, param, value):
+        low, high = self.bounds[param]
+        value = min(max(value, low), high)
+        return int(round(value)) if param == 'interval' else value
+
+    def _move(self):
+        """Move self._param one step in self._direction; return False if it is already at its bound"""
+        value = self.params[self._param]
+        new = value * (1 + self.steps[self._param]) ** self._direction
+        if self._param == 'interval' and abs(new - value) < 1:
+            # Intervals are whole seconds, so a small relative step would round back to the same value
+            new = value + self._direction
+        new = self._clip(self._param, new)
+        if new == value:
+            return False
+        self._previous = value
+        self.params[self._param] = new
+        return True
+
+    def _next_param(self):
+        self.steps[self._param] = max(self.steps[self._param] / 2, self.min_step)
+        self._param = 'interval' if self._param == 'alpha' else 'alpha'
+        self._direction = 1
+        self._reversed = False
+        self._previous = None
+
+    def observe(self, objective):
+        """Record the objective of one tick, and decide on a new setting at the end of an epoch
+
+        :param objective: the objective of the tick, or None to skip it
+        :return: a dict with the new 'alpha' and 'interval' if they changed, otherwise None
+        """
+        if objective is not None:
+            self._window.append(objective)
+        if len(self._window) < self.epoch:
+            return None
+        score = float(np.mean(self._window))
+        self._window = []
+        before = dict(self.params)
+
+        if self._best is None or score > self._best:
+            logger.info("Tuner: objective {:.6f} with {}, keeping it".format(score, self.params))
+            self._best = score
+        elif self._previous is not None:
+            logger.info("Tuner: objective {:.6f} with {} is worse than {:.6f}, undoing the move"
+                        .format(score, self.params, self._best))
+            self.params[self._param] = self._previous
+            self._previous = None
+            if self._reversed:
+                self._next_param()
+            else:
+                self._direction = -self._direction
+                self._reversed = True
+        else:
+            # The objective drifted down without a move, e.g. because the jobs are converging: rebase on it
+            self._best = score
+
+        if not self._move():
+            if not self._reversed:
+                self._direction = -self._direction
+                self._reversed = True
+            else:
+                self._next_param()
+            self._move()
+
+        if self.params == before:
+            return None
+        logger.info("Tuner: moving to {}".format(self.params))
+        return dict(self.params)
@@ -1,37 +1,191 @@
 """Generate a list of jobs to use across experiments, and save to a CSV.
+
+Start offsets are drawn from one of several arrival processes (or read from a cluster trace), and every job gets
+an expected duration, a priority, a CPU hint, optionally a deadline, and the number of training jobs packed into its
+container alongside its image. All columns are generated
+with vectorized numpy calls so that joblists of tens of thousands of jobs can be written in well under a second.
 """
 
-import random
 import argparse
 
 import numpy as np
 import pandas as pd
 
-parser = argparse.ArgumentParser()
 
+IMAGES = ['wzheng33/gru:latest', 'wzheng33/lstmcfc:latest', 'wzheng33/lstmcrf:latest', 'wzheng33/tc10:latest']
+#IMAGES = ['mtynes/vae:latest', 'mtynes/mnist:latest']
+
+ARRIVALS = ['uniform', 'poisson', 'bursty', 'diurnal']
+COLUMNS = ['seconds', 'images', 'duration', 'priority', 'cpus', 'deadline', 'njobs']
+
+
+def uniform_arrivals(rng, n, seconds):
+    """Offsets drawn uniformly over [0, seconds)"""
+    return rng.uniform(0, seconds, n)
+
+
+def poisson_arrivals(rng, n, seconds):
+    """Offsets of a homogeneous Poisson process whose rate puts the expected last arrival at `seconds`"""
+    if n == 0:
+        return np.zeros(0)
+    gaps = rng.exponential(seconds / n, n)
+    return np.cumsum(gaps) - gaps[0]
+
+
+def bursty_arrivals(rng, n, seconds, burst_size=8, burst_width=5.0):
+    """Offsets clustered into bursts: burst starts are uniform, and jobs land exponentially close after a start
+
+    Jobs that would land past `seconds` wrap around to the start of the window.
+
+    :param burst_size: mean number of jobs per burst
+    :param burst_width: mean spread, in seconds, of the jobs within a burst
+    """
+    num_bursts = max(1, int(np.ceil(n / burst_size)))
+    starts = rng.uniform(0, seconds, num_bursts)
+    offsets = starts[rng.randint(0, num_bursts, n)] + rng.exponential(burst_width, n)
+    return np.mod(offsets, seconds) if seconds > 0 else np.zeros(n)
+
+
+def diurnal_arrivals(rng, n, seconds, period=86400.0, amplitude=0.8):
+    """Offsets of a Poisson process whose rate follows a sinusoidal day/night cycle
 
-parser.add_argument('name', help='name for job table')
-parser.add_argument('-s', '--seconds', type=int, default=100)
-parser.add_argument('-m', '--models', type=int, default=2)
-parser.add_argument('-c', '--containers', type=int, default=10)
+    Sampled by inverting the cumulative intensity on a fine grid.
 
-args = parser.parse_args()
+    :param period: length of one cycle in seconds
+    :param amplitude: relative swing of the arrival rate around its mean, in [0, 1)
+    """
+    grid = np.linspace(0, seconds, 4096)
+    intensity = 1 + amplitude * np.sin(2 * np.pi * grid / period)
+    cdf = np.cumsum(intensity)
+    cdf = (cdf - cdf[0]) / (cdf[-1] - cdf[0])
+    return np.interp(rng.uniform(0, 1, n), cdf, grid)
 
-seconds = args.seconds
-num_containers = args.containers
-num_models = args.models
 
+def job_parameters(rng, n, duration=600.0, priorities=3, cpus=(1, 2, 4), deadline_fraction=0.0, slack=(1.5, 3.0),
+                   max_jobs=1):
+    """Draw per-job expected durations, priorities, CPU hints, deadlines and numbers of packed training jobs
 
-images = ['wzheng33/gru:latest', 'wzheng33/lstmcfc:latest', 'wzheng33/lstmcrf:latest', 'wzheng33/tc10:latest']
-#images = ['mtynes/vae:latest', 'mtynes/mnist:latest']
-images = random.sample(images, num_models)
+    :param duration: median expected duration in seconds; durations are log-normal around it
+    :param priorities: number of priority levels; 1 is the lowest and the most common. The priority is also the
+                       job's weight when allocating CPU
+    :param cpus: the CPU hints to choose from
+    :param deadline_fraction: fraction of jobs that get a deadline
+    :param slack: (low, high) range of deadlines as a multiple of the job's expected duration
+    :param max_jobs: containers run between 1 and this many training jobs, uniformly
+    :return: a dict of numpy arrays keyed by column name; deadlines are in seconds after the job's start, NaN if none
+    """
+    levels = np.arange(1, priorities + 1)
+    weights = 1.0 / levels
+    durations = np.round(rng.lognormal(np.log(duration), 0.5, n), 1)
+    deadlines = np.round(durations * rng.uniform(slack[0], slack[1], n), 1)
+    return dict(
+        duration=durations,
+        priority=rng.choice(levels, n, p=weights / weights.sum()),
+        cpus=rng.choice(np.asarray(cpus), n),
+        deadline=np.where(rng.uniform(0, 1, n) < deadline_fraction, deadlines, np.nan),
+        njobs=rng.randint(1, max_jobs + 1, n),
+    )
 
 
-def make_joblist(images, seconds, num_containers, name):
-    images = np.random.choice(images, num_containers)
-    seconds = np.sort(np.random.choice(list(range(seconds)), num_containers))
-    table = pd.DataFrame.from_items(zip(['seconds', 'images'], [seconds, images]))
+def trace_jobs(trace, n, time_col='submit_time', scale=1.0):
+    """Read start offsets, and any per-job parameters present, from an existing cluster-trace CSV
+
+    :param trace: path to the trace CSV
+    :param n: number of jobs to take from the start of the trace, or all of them if 0
+    :param time_col: name of the column holding submission times
+    :param scale: factor applied to the offsets, e.g. 0.1 to replay the trace ten times faster
+    :return: a dict of numpy arrays keyed by column name; cells may be NaN where the trace has no value
+    """
+    table = pd.read_csv(trace)
+    table = table.sort_values(time_col)
+    if n > 0:
+        table = table.iloc[:n]
+    times = table[time_col].values.astype(float)
+    jobs = {col: table[col].values for col in COLUMNS if col in table.columns and col != 'seconds'}
+    jobs['seconds'] = (times - times.min()) * scale
+    return jobs
+
+
+def make_joblist(images, seconds, num_containers, name, arrival='uniform', trace=None, trace_time_col='submit_time',
+                 trace_scale=1.0, duration=600.0, priorities=3, deadline_fraction=0.0, max_jobs=1, integer=False,
+                 seed=None, period=86400.0, amplitude=0.8):
+    """Generate a joblist and write it to `<name>_jobtable.csv`
+
+    :param images: the images to choose from for each job
+    :param seconds: length of the arrival window in seconds
+    :param num_containers: number of jobs to generate
+    :param arrival: one of ARRIVALS; ignored if `trace` is given
+    :param trace: optional path to a cluster-trace CSV to drive the start offsets
+    :param integer: round offsets down to whole seconds, as older joblists did
+    :param period: length of one day/night cycle in seconds for the diurnal arrival process
+    :param amplitude: relative swing of the arrival rate for the diurnal arrival process, in [0, 1)
+    :return: the joblist as a pd.DataFrame
+    """
+    rng = np.random.RandomState(seed)
+
+    if trace is not None:
+        jobs = trace_jobs(trace, num_containers, time_col=trace_time_col, scale=trace_scale)
+        num_containers = len(jobs['seconds'])
+    else:
+        arrivals = {'uniform': uniform_arrivals, 'poisson': poisson_arrivals, 'bursty': bursty_arrivals,
+                    'diurnal': lambda rng, n, seconds: diurnal_arrivals(rng, n, seconds, period, amplitude)}
+        jobs = {'seconds': arrivals[arrival](rng, num_containers, seconds)}
+
+    params = job_parameters(rng, num_containers, duration=duration, priorities=priorities,
+                            deadline_fraction=deadline_fraction, max_jobs=max_jobs)
+    for col, values in params.items():
+        if col not in jobs:
+            jobs[col] = values
+        elif col != 'deadline':
+            # Fill the gaps in a trace's columns from the generated parameters; a missing deadline means none
+            jobs[col] = np.where(pd.isnull(jobs[col]), values, jobs[col])
+    jobs.setdefault('images', rng.choice(images, num_containers))
+
+    offsets = np.floor(jobs['seconds']) if integer else np.round(jobs['seconds'], 3)
+    jobs['seconds'] = offsets.astype(int) if integer else offsets
+
+    table = pd.DataFrame(jobs)[COLUMNS]
+    table = table.sort_values('seconds', kind='mergesort')
     table.to_csv('{}_jobtable.csv'.format(name), index=False)
+    return table
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('name', help='name for job table')
+    parser.add_argument('-s', '--seconds', type=float, default=100)
+    parser.add_argument('-m', '--models', type=int, default=2)
+    parser.add_argument('-c', '--containers', type=int, default=10)
+    parser.add_argument('--arrival', choices=ARRIVALS, default='uniform',
+                        help='Arrival process used to draw start offsets')
+    parser.add_argument('--period', type=float, default=86400.0,
+                        help='Length in seconds of one day/night cycle of the diurnal arrival process')
+    parser.add_argument('--amplitude', type=float, default=0.8,
+                        help='Relative swing of the diurnal arrival rate around its mean, in [0, 1)')
+    parser.add_argument('--trace', default=None,
+                        help='A cluster-trace CSV to take start offsets (and any matching columns) from')
+    parser.add_argument('--trace_time_col', default='submit_time',
+                        help='Column of the trace holding submission times')
+    parser.add_argument('--trace_scale', type=float, default=1.0,
+                        help='Factor applied to trace offsets')
+    parser.add_argument('--duration', type=float, default=600.0,
+                        help='Median expected job duration in seconds')
+    parser.add_argument('--priorities', type=int, default=3,
+                        help='Number of priority levels')
+    parser.add_argument('--deadline_fraction', type=float, default=0.0,
+                        help='Fraction of jobs given a deadline of 1.5-3 times their expected duration')
+    parser.add_argument('--max_jobs', type=int, default=1,
+                        help='Pack between 1 and this many training jobs into each container')
+    parser.add_argument('--integer', action='store_true',
+                        help='Use whole-second offsets')
+    parser.add_argument('--seed', type=int, default=None)
+
+    args = parser.parse_args()
 
+    rng = np.random.RandomState(args.seed)
+    images = list(rng.choice(IMAGES, args.models, replace=False))
 
-make_joblist(images, seconds, num_containers, args.name)
+    make_joblist(images, args.seconds, args.containers, args.name, arrival=args.arrival, trace=args.trace,
+                 trace_time_col=args.trace_time_col, trace_scale=args.trace_scale, duration=args.duration,
+                 priorities=args.priorities, deadline_fraction=args.deadline_fraction, max_jobs=args.max_jobs,
+                 integer=args.integer, seed=args.seed, period=args.period, amplitude=args.amplitude)
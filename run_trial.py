@@ -10,6 +10,8 @@ import logging
 import pandas as pd
 
 import utils
+from app.policies import POLICIES
+from app.shadow import ShadowPolicy
 from app.trial import Trial
 from utils import get_logger
 
@@ -20,18 +22,32 @@ logger = get_logger(__name__)
 
 
 def run_job_list(job_list):
-    """"""
-    jobs = pd.read_csv(job_list)
-    stop = jobs.seconds.max()
+    """Launch every job in `job_list` at its offset, in seconds, from the time this is called
 
-    for i in range(stop+1):
-        jobs_i = jobs[jobs.seconds == i]
-        # print('i:', i, '\njobs_i:\n', jobs_i)
-        if jobs_i.shape[0] > 0:
-            for job in jobs_i.images:
-                subprocess.Popen(['docker', 'run', job], stdout=DEVNULL)
-                logger.info('Launching container with `docker run {}`'.format(job))
-        time.sleep(1)
+    Offsets may be fractional; jobs are walked in order and we sleep only until the next one is due.
+    A job's priority, deadline and number of packed training jobs, if the joblist has them, are attached to its
+    container as labels (see utils.get_container_labels).
+    """
+    jobs = pd.read_csv(job_list).sort_values('seconds', kind='mergesort')
+    priorities = jobs.priority.values if 'priority' in jobs.columns else [None] * len(jobs)
+    deadlines = jobs.deadline.values if 'deadline' in jobs.columns else [None] * len(jobs)
+    njobs = jobs.njobs.values if 'njobs' in jobs.columns else [1] * len(jobs)
+    start = time.time()
+
+    for offset, job, priority, deadline, n in zip(jobs.seconds.values, jobs.images.values, priorities, deadlines,
+                                                  njobs):
+        delay = start + offset - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        labels = []
+        if priority is not None and not pd.isnull(priority):
+            labels += ['--label', 'flowcon.priority={}'.format(priority)]
+        if deadline is not None and not pd.isnull(deadline):
+            labels += ['--label', 'flowcon.deadline={:.3f}'.format(time.time() + deadline)]
+        if n > 1:
+            labels += ['--label', 'flowcon.njobs={}'.format(int(n))]
+        subprocess.Popen(['docker', 'run'] + labels + [job], stdout=DEVNULL)
+        logger.info('Launching container with `docker run {}`'.format(' '.join(labels + [job])))
 
 if __name__ == '__main__':
 
@@ -41,8 +57,40 @@ if __name__ == '__main__':
                         help='The interval at which to run algorithm 1')
     parser.add_argument('-a', '--alpha', type=float, default=0.03,
                         help='Rate at which to change resource allocation')
+    parser.add_argument('-p', '--policy', choices=sorted(POLICIES), default='algo_1',
+                        help='Allocation policy to run')
+    parser.add_argument('--io_aware', action='store_true',
+                        help='Stop giving CPU to containers bound by disk or network I/O, and set blkio weights')
+    parser.add_argument('--freeze', action='store_true',
+                        help='Pause completing containers with `docker pause` while others are still growing, '
+                             'letting them run in turn')
+    parser.add_argument('--freeze_slots', type=int, default=1,
+                        help='Number of completing containers left running at a time with --freeze')
     parser.add_argument("--docker_stats_interval", type=float, default=10,
                         help="Number of seconds between calls to `docker stats`")
+    parser.add_argument('--stats_cpu_budget', type=float, default=None,
+                        help='Sample `docker stats` adaptively, sampling stable containers less often, to keep the '
+                             'controller within this many cpus (e.g. 0.05)')
+    parser.add_argument('--log_source', choices=['docker', 'json-file'], default='docker',
+                        help="Read container logs through `docker logs`, or memory-map the json-file driver's "
+                             "log files and only parse what was appended since the last read")
+    parser.add_argument('--autotune', action='store_true',
+                        help='Adjust alpha and interval during the trial to improve loss reduction per CPU-second')
+    parser.add_argument('--alpha_bounds', type=float, nargs=2, default=(0.005, 0.2), metavar=('LOW', 'HIGH'),
+                        help='Bounds for alpha when autotuning')
+    parser.add_argument('--interval_bounds', type=int, nargs=2, default=(10, 120), metavar=('LOW', 'HIGH'),
+                        help='Bounds for interval when autotuning; LOW is raised to at least twice '
+                             '--docker_stats_interval')
+    parser.add_argument('--shadow', action='append', default=[], metavar='[POLICY:]ALPHA:INTERVAL[:BETA]',
+                        help='Run a policy (algo_1 by default) with these parameters alongside the live one, recording '
+                             'its decisions without applying them. May be given several times')
+    parser.add_argument('--trace', action='store_true',
+                        help='Record a timeline of controller operations in Chrome trace-event format')
+    parser.add_argument('--log_level', action='append', default=[], metavar='NAME=LEVEL',
+                        help="Set the log level of a subsystem, e.g. app.container_wrapper=DEBUG or app=WARNING. "
+                             "May be given several times")
+    parser.add_argument('--log_format', choices=['text', 'json'], default='text',
+                        help='Write FlowCon.log as text lines or as one JSON object per record')
     control = parser.add_mutually_exclusive_group()
     control.add_argument('--no_update', action='store_true',
                          help='Run the algorithm but do not update any container limits')
@@ -52,6 +100,10 @@ if __name__ == '__main__':
                          help='Do not run the backoff listener')
 
     args = parser.parse_args()
+    if args.log_format == 'json':
+        utils.stop_logging()
+        utils.start_logging(structured=True)
+    utils.set_log_levels(dict(spec.split('=', 1) for spec in args.log_level))
     for arg, val in vars(args).items():
         logger.info("Argument {}: {}".format(arg, val))
 
@@ -78,12 +130,23 @@ if __name__ == '__main__':
 
     session_name = "no_algo" if args.no_algo \
                    else "no_update" if args.no_update \
-                   else "a{}_i{}".format(args.alpha, args.interval)
+                   else "a{}_i{}".format(args.alpha, args.interval) if args.policy == 'algo_1' \
+                   else "{}_a{}_i{}".format(args.policy, args.alpha, args.interval)
+    if args.autotune:
+        session_name += "_autotune"
+    if args.io_aware:
+        session_name += "_io"
+    if args.freeze:
+        session_name += "_freeze"
     logger.info(
         "Running trial with arguments a = {}, i = {}, name = {}".format(args.alpha, args.interval, session_name))
     start_time = time.time()
     logger.info("Session start time: {}".format(start_time))
     trial = Trial(interval=args.interval, name=session_name, alpha=args.alpha, no_algo=args.no_algo,
-                  no_update=args.no_update, stats_interval=args.docker_stats_interval, start_time=start_time,no_backoff=args.no_backoff)
+                  no_update=args.no_update, stats_interval=args.docker_stats_interval, start_time=start_time,no_backoff=args.no_backoff,
+                  log_source=args.log_source, shadows=[ShadowPolicy.from_spec(spec) for spec in args.shadow],
+                  trace=args.trace, policy=args.policy, stats_cpu_budget=args.stats_cpu_budget,
+                  autotune=args.autotune, alpha_bounds=args.alpha_bounds, interval_bounds=args.interval_bounds,
+                  io_aware=args.io_aware, freeze=args.freeze, freeze_slots=args.freeze_slots)
     trial.start()
     run_job_list(args.joblist)
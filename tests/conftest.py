@@ -0,0 +1,12 @@
+"""Shared setup for the test suite
+
+Run from the repository root with `python -m pytest`. The controller's modules log to FlowCon.log in the working
+directory as soon as they are imported, so the writer thread is started on a temporary file first.
+"""
+
+import os
+import tempfile
+
+import utils
+
+utils.start_logging(os.path.join(tempfile.mkdtemp(prefix='flowcon-tests-'), 'FlowCon.log'))
@@ -0,0 +1,37 @@
+import time
+
+from app.container_list import ContainerList
+
+
+class FakeContainer(object):
+    """The attributes of a ContainerWrapper that ContainerList reads when a container finishes"""
+
+    def __init__(self, id, deadline=None, priority=1):
+        self.id          = id
+        self.deadline    = deadline
+        self.priority    = priority
+        self.frozen_time = 0
+        self.killed      = False
+
+    def kill(self):
+        self.killed = True
+
+
+def test_killall_records_running_containers_as_missing_their_deadlines():
+    containers = ContainerList(trial_start=time.time(), interval=30)
+    containers.containers = [FakeContainer('early', deadline=time.time() - 10),
+                             FakeContainer('late', deadline=time.time() + 1000), FakeContainer('none')]
+    containers.killall('exp', save_logs=False)
+
+    assert all(c.killed for c in containers)
+    assert [(r['c_id'], r['met'], r['killed']) for r in containers.finished] == \
+           [('early', False, True), ('late', False, True), ('none', None, True)]
+    assert containers.deadlines_met == (0, 2)
+
+
+def test_finish_records_whether_the_deadline_was_met():
+    containers = ContainerList(trial_start=time.time(), interval=30)
+    containers._finish(FakeContainer('a', deadline=time.time() + 1000))
+    containers._finish(FakeContainer('b', deadline=time.time() - 1))
+    assert [r['met'] for r in containers.finished] == [True, False]
+    assert containers.deadlines_met == (1, 2)
@@ -0,0 +1,80 @@
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.container_wrapper import ContainerWrapper, interval_loss, job_interval_loss, job_progress
+from app.log_source import JsonFileLogSource, parse_loss_lines
+
+NOW = 1000.0
+
+
+def history(rows):
+    """A loss history from (job, loss, time) rows"""
+    return pd.DataFrame([dict(job=job, loss=loss, time=t) for job, loss, t in rows], columns=['loss', 'time', 'job'])
+
+
+def test_parse_loss_lines_reads_job_tags():
+    logs = b'Job: a Loss: 0.5 Time: 1\nLoss: 0.4 Time: 2\nJob: b-2.x Loss: 0.3 Time: 3\nJob: a epoch done\n'
+    assert parse_loss_lines(logs) == ([0.5, 0.4, 0.3], [1.0, 2.0, 3.0], ['a', None, 'b-2.x'])
+
+
+def test_each_job_is_normalized_by_its_own_maximum():
+    rows = [('a', 4.0, 960), ('a', 2.0, 980), ('a', 1.0, 995),
+            ('b', 0.4, 960), ('b', 0.2, 980), ('b', 0.2, 995)]
+    losses = job_interval_loss(history(rows), NOW, 30)
+    assert list(losses.index) == ['a', 'b']
+    np.testing.assert_allclose(losses.E_i, [0.375, 0.5])
+    np.testing.assert_allclose(losses.E_i_minus_1, [1.0, 1.0])
+
+    # A single job gives the same as the container-level computation
+    single = history(rows[:3])
+    assert tuple(job_interval_loss(single, NOW, 30).loc['a']) == interval_loss(single, NOW, 30)
+
+
+def test_untagged_lines_are_dropped():
+    rows = [('a', 1.0, 960), ('a', 0.5, 990), (None, 100.0, 960), (None, 0.0, 990)]
+    losses = job_interval_loss(history(rows), NOW, 30)
+    assert list(losses.index) == ['a']
+    np.testing.assert_allclose(losses.loc['a'], [0.5, 1.0])
+
+
+def test_empty_history():
+    for rows in [[], [(None, 1.0, 990)]]:
+        losses = job_interval_loss(history(rows), NOW, 30)
+        assert losses.empty
+        assert job_progress(losses, 30).sum() == 0
+
+
+def test_job_progress_is_zero_without_both_intervals():
+    rows = [('a', 1.0, 960), ('a', 0.4, 990), ('b', 1.0, 990)]
+    np.testing.assert_allclose(job_progress(job_interval_loss(history(rows), NOW, 30), 30), [0.02, 0])
+
+
+class Monitor(object):
+    def cpu_mean(self, id, interval):
+        return 0.25
+
+
+def test_container_progress_and_growth_are_summed_over_jobs(tmp_path):
+    now = time.time()
+    path = str(tmp_path / 'c-json.log')
+    with open(path, 'w') as f:
+        for k in range(60):
+            for job, loss in [('a', 1.0 / (k + 1)), ('b', 2 - k / 100)]:
+                text = 'Job: {} Loss: {} Time: {}\n'.format(job, loss, now - 59 + k)
+                f.write(json.dumps({'log': text, 'stream': 'stdout'}) + '\n')
+
+    c = ContainerWrapper(now - 100, 20, id='c', njobs=2, updatable=False)
+    c.log_source = JsonFileLogSource(path)
+    c._compute_loss()
+    growth = c.growth(Monitor())
+
+    assert list(c.jobs.index) == ['a', 'b']
+    assert c.progress == pytest.approx(c.jobs.progress.sum())
+    assert growth == pytest.approx(c.jobs.progress.sum() / 0.25)
+    assert growth == pytest.approx(c.jobs.growth.sum())
+    assert c.E_i == pytest.approx(c.jobs.E_i.mean())
+    assert c.jobs_updated >= now
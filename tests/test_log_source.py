@@ -0,0 +1,114 @@
+import json
+import os
+
+import pytest
+
+import app.log_source as log_source
+from app.log_source import JsonFileLogSource, parse_loss_lines
+
+
+def entry(text, stream='stdout'):
+    return json.dumps({'log': text + '\n', 'stream': stream, 'time': '2018-09-25T16:18:32.110Z'},
+                      separators=(',', ':')) + '\n'
+
+
+def write(path, lines, mode='a'):
+    with open(path, mode) as f:
+        f.write(''.join(lines))
+
+
+def loss_line(i):
+    return 'Loss: {} Time: {}'.format(1.0 / (i + 1), 1000 + i)
+
+
+def test_matches_parse_of_docker_logs_output(tmp_path):
+    path = str(tmp_path / 'c-json.log')
+    texts = [loss_line(i) for i in range(20)] + ['epoch done', 'Job: a ' + loss_line(20)]
+    write(path, [entry(text) for text in texts] + [entry('Loss: 9 Time: 9', stream='stderr')])
+
+    stdout = ''.join(text + '\n' for text in texts).encode()
+    assert JsonFileLogSource(path).read_new() == parse_loss_lines(stdout)
+
+
+def test_skips_stderr(tmp_path):
+    path = str(tmp_path / 'c-json.log')
+    write(path, [entry(loss_line(0)), entry(loss_line(1), stream='stderr'), entry(loss_line(2))])
+    loss, timestamp, job = JsonFileLogSource(path).read_new()
+    assert timestamp == [1000, 1002]
+
+
+def test_reads_only_new_complete_lines(tmp_path):
+    path = str(tmp_path / 'c-json.log')
+    source = JsonFileLogSource(path)
+    write(path, [entry(loss_line(0))])
+    partial = entry(loss_line(1))
+    write(path, [partial[:10]])
+    assert source.read_new()[1] == [1000]
+    assert source.read_new() == ([], [], [])
+
+    write(path, [partial[10:], entry(loss_line(2))])
+    assert source.read_new()[1] == [1001, 1002]
+
+
+def test_follows_rotation(tmp_path):
+    path = str(tmp_path / 'c-json.log')
+    source = JsonFileLogSource(path)
+    write(path, [entry(loss_line(0))])
+    assert source.read_new()[1] == [1000]
+
+    # The driver renames the full file to .1 and starts a new one with a new inode
+    write(path, [entry(loss_line(1))])
+    os.rename(path, path + '.1')
+    write(path, [entry(loss_line(2))], mode='w')
+    assert source.read_new()[1] == [1001, 1002]
+    assert source.read_new()[1] == []
+
+
+def test_follows_truncation(tmp_path):
+    path = str(tmp_path / 'c-json.log')
+    source = JsonFileLogSource(path)
+    write(path, [entry(loss_line(i)) for i in range(5)])
+    assert len(source.read_new()[0]) == 5
+
+    write(path, [entry(loss_line(5))], mode='w')
+    assert source.read_new()[1] == [1005]
+
+
+def test_missing_file(tmp_path):
+    source = JsonFileLogSource(str(tmp_path / 'missing-json.log'))
+    assert source.read_new() == ([], [], [])
+    write(source.path, [entry(loss_line(0))])
+    assert source.read_new()[1] == [1000]
+
+
+def inspect_output(monkeypatch, output):
+    monkeypatch.setattr(log_source.subprocess, 'check_output', lambda args: output.encode('ascii') + b'\n')
+
+
+def test_from_container_finds_the_json_file_log(monkeypatch, tmp_path):
+    path = str(tmp_path / 'c-json.log')
+    inspect_output(monkeypatch, 'json-file ' + path)
+    assert JsonFileLogSource.from_container('c').path == path
+
+
+@pytest.mark.parametrize('output', ['journald ', 'local /var/lib/docker/containers/c/local-logs/container.log',
+                                    'json-file '])
+def test_from_container_rejects_other_log_drivers(monkeypatch, output):
+    inspect_output(monkeypatch, output)
+    with pytest.raises(ValueError, match='--log_source docker'):
+        JsonFileLogSource.from_container('c')
+
+
+def test_unreadable_log_files_fail_clearly(monkeypatch, tmp_path):
+    path = str(tmp_path / 'c-json.log')
+    write(path, [entry(loss_line(0))])
+
+    def denied(*args, **kwargs):
+        raise PermissionError(13, 'Permission denied')
+
+    inspect_output(monkeypatch, 'json-file ' + path)
+    monkeypatch.setattr(log_source, 'open', denied, raising=False)
+    with pytest.raises(PermissionError, match='Cannot read the container log file'):
+        JsonFileLogSource.from_container('c')
+    with pytest.raises(PermissionError, match='Cannot read the container log file'):
+        JsonFileLogSource(path).read_new()
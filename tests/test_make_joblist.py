@@ -0,0 +1,35 @@
+import numpy as np
+
+from make_joblist import bursty_arrivals, diurnal_arrivals, make_joblist, poisson_arrivals, uniform_arrivals
+
+
+def test_arrivals_with_no_jobs():
+    rng = np.random.RandomState(0)
+    for arrivals in [uniform_arrivals, poisson_arrivals, bursty_arrivals, diurnal_arrivals]:
+        assert len(arrivals(rng, 0, 100)) == 0
+
+
+def test_bursty_arrivals_stay_in_window_without_piling_up_at_the_end():
+    offsets = bursty_arrivals(np.random.RandomState(0), 10000, 100, burst_width=50.0)
+    assert offsets.min() >= 0 and offsets.max() < 100
+    assert (offsets == 100).sum() == 0
+    assert np.histogram(offsets, bins=10, range=(0, 100))[0].max() < 0.2 * len(offsets)
+
+
+def test_diurnal_arrivals_follow_the_period():
+    offsets = diurnal_arrivals(np.random.RandomState(0), 20000, 100, period=100, amplitude=0.9)
+    day, night = np.histogram(offsets, bins=2, range=(0, 100))[0]
+    # The rate is above its mean for the first half of a period and below it for the second
+    assert day > 2 * night
+
+
+def test_trace_gaps_are_filled_from_generated_parameters(tmp_path):
+    trace = tmp_path / 'trace.csv'
+    trace.write_text('submit_time,priority,deadline\n10,2,\n0,,300\n5,3,\n')
+    table = make_joblist(['img'], 100, 0, str(tmp_path / 'trace'), trace=str(trace), seed=0)
+
+    assert list(table.seconds) == [0, 5, 10]
+    assert not table.priority.isnull().any()
+    assert list(table.priority)[1:] == [3, 2]
+    # A missing deadline in the trace means the job has none
+    assert table.deadline.isnull().sum() == 2 and list(table.deadline)[0] == 300
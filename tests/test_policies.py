@@ -0,0 +1,201 @@
+import numpy as np
+import pytest
+
+from app.policies import (DEFAULT_BLKIO_WEIGHT, POLICIES, Algo1Policy, DeadlinePolicy, EqualSharePolicy,
+                          GrowthProportionalPolicy, IOAwarePolicy, MaxMinFairPolicy, Snapshot, make_policy,
+                          max_min_fair)
+
+
+def snapshot(growth, watching=None, completing=None, limits=None, cpu_mean=None, io_rate=None, weights=None,
+             slack=None, n_cpus=8, beta=1.5):
+    growth = np.asarray(growth, dtype=float)
+    n = len(growth)
+
+    def array(values, default, dtype=float):
+        return np.full(n, default, dtype=dtype) if values is None else np.asarray(values, dtype=dtype)
+
+    return Snapshot(ids=['c{}'.format(i) for i in range(n)], growth=growth, loss=np.zeros(n), progress=np.zeros(n),
+                    ages=np.zeros(n), watching=array(watching, False, bool), completing=array(completing, False, bool),
+                    limits=array(limits, n_cpus), cpu_mean=array(cpu_mean, np.nan), io_rate=array(io_rate, np.nan),
+                    weights=array(weights, 1), slack=array(slack, np.nan), n_cpus=n_cpus, beta=beta)
+
+
+def baseline_algo_1(s, alpha):
+    """The per-container loop that algo_1 ran before policies were vectorized, over plain lists"""
+    n = len(s.ids)
+    watching = list(s.watching)
+    completing = list(s.completing)
+    limits = [np.nan] * n
+    all_completing = all(completing)
+    for i in range(n):
+        if s.growth[i] < alpha and not completing[i]:
+            completing[i] = bool(watching[i])
+            watching[i] = not watching[i]
+        elif s.growth[i] >= alpha:
+            watching[i] = completing[i] = False
+
+    if all_completing and n != 0:
+        limits = [s.n_cpus] * n
+    else:
+        growth_sum = sum(s.growth)
+        for i in range(n):
+            if growth_sum == 0:
+                break
+            if not watching[i]:
+                ratio = s.growth[i] / growth_sum
+                share = max(ratio, 1 / (s.beta * n)) if completing[i] else min(ratio, 1)
+                limits[i] = share * s.n_cpus
+    return limits, watching, completing
+
+
+def test_algo_1_matches_baseline_loop():
+    rng = np.random.RandomState(0)
+    policy = Algo1Policy(alpha=0.05)
+    for _ in range(2000):
+        n = rng.randint(0, 6)
+        growth = np.where(rng.uniform(size=n) < 0.2, 0, rng.exponential(0.05, n))
+        s = snapshot(growth, watching=rng.uniform(size=n) < 0.3, completing=rng.uniform(size=n) < 0.4,
+                     n_cpus=rng.randint(1, 33), beta=1 + rng.uniform())
+        allocation = policy.allocate(s)
+        limits, watching, completing = baseline_algo_1(s, policy.alpha)
+        np.testing.assert_allclose(allocation.limits, limits)
+        assert list(allocation.watching) == watching
+        assert list(allocation.completing) == completing
+
+
+def test_algo_1_watches_before_completing():
+    policy = Algo1Policy(alpha=0.1)
+    first = policy.allocate(snapshot([0.01, 0.5]))
+    assert list(first.watching) == [True, False] and list(first.completing) == [False, False]
+    assert np.isnan(first.limits[0])
+
+    second = policy.allocate(snapshot([0.01, 0.5], watching=first.watching, completing=first.completing))
+    assert list(second.watching) == [False, False] and list(second.completing) == [True, False]
+    # The completing container gets at least 1/(beta*n) of the host
+    assert second.limits[0] == pytest.approx(8 / (1.5 * 2))
+
+
+def test_algo_1_gives_everything_when_all_completing():
+    allocation = Algo1Policy(alpha=0.1).allocate(snapshot([0.01, 0.02], completing=[True, True]))
+    assert list(allocation.limits) == [8, 8]
+
+
+@pytest.mark.parametrize('name', sorted(POLICIES))
+def test_empty_snapshot(name):
+    allocation = make_policy(name).allocate(snapshot([]))
+    assert len(allocation.limits) == len(allocation.watching) == len(allocation.completing) == 0
+
+
+def test_equal_share():
+    assert list(EqualSharePolicy().allocate(snapshot([0, 1, 2, 3])).limits) == [2, 2, 2, 2]
+
+
+def test_max_min_fair_water_filling():
+    np.testing.assert_allclose(max_min_fair(np.array([0.1, 0.2, 0.9, 0.9])), [0.1, 0.2, 0.35, 0.35])
+    np.testing.assert_allclose(max_min_fair(np.array([0.1, 0.2])), [0.1, 0.2])
+    np.testing.assert_allclose(max_min_fair(np.array([1.0, 1.0, 1.0, 1.0])), [0.25] * 4)
+    np.testing.assert_allclose(max_min_fair(np.array([4.0, 1.0]), capacity=3.0), [2.0, 1.0])
+    assert len(max_min_fair(np.zeros(0))) == 0
+
+
+def test_max_min_fair_policy_demands_whole_host_when_cpu_unknown():
+    allocation = MaxMinFairPolicy(headroom=1.0).allocate(snapshot([0, 0, 0], cpu_mean=[0.1, np.nan, np.nan]))
+    np.testing.assert_allclose(allocation.limits, [0.8, 3.6, 3.6])
+
+
+def test_growth_proportional():
+    allocation = GrowthProportionalPolicy(alpha=0.1).allocate(snapshot([0.05, 0.15, 0.8], beta=2))
+    assert list(allocation.completing) == [True, False, False]
+    np.testing.assert_allclose(allocation.limits, [8 / 6, 8 / 6, 6.4])
+
+    idle = GrowthProportionalPolicy().allocate(snapshot([0, 0]))
+    assert list(idle.limits) == [4, 4]
+
+
+def test_deadline_weights_priority_and_urgency():
+    policy = DeadlinePolicy(alpha=0.01, urgency=3.0)
+    s = snapshot([0.1, 0.1, 0.1, 0.1], weights=[1, 2, 1, 1], slack=[np.nan, np.nan, 0.0, -0.5])
+    np.testing.assert_allclose(policy.score(s), [0.1, 0.2, 0.4, 0.1])
+    np.testing.assert_allclose(policy.allocate(s).limits, [1, 2, 4, 1])
+
+
+def test_make_policy_rejects_unknown_names():
+    with pytest.raises(ValueError):
+        make_policy('nope')
+
+
+def test_deadline_urgency_rises_as_slack_runs_out():
+    policy = DeadlinePolicy(alpha=0.01, urgency=3.0)
+    score = policy.score(snapshot([0.1] * 5, slack=[2.0, 1.0, 0.5, 0.25, 0.0]))
+    np.testing.assert_allclose(score, [0.1, 0.1, 0.25, 0.325, 0.4])
+    assert (np.diff(score) >= 0).all()
+
+
+def test_io_aware_caps_io_bound_containers_and_gives_the_rest_away():
+    policy = IOAwarePolicy(Algo1Policy(alpha=0.03), io_threshold=5e6)
+    s = snapshot([0.5, 0.3, 0.2], limits=[4, 4, 4], cpu_mean=[0.02, 0.3, 0.2], io_rate=[1e7, 1e3, np.nan], n_cpus=12)
+    allocation = policy.allocate(s)
+    # Algorithm 1 alone gives [6, 3.6, 2.4]; the first container only uses 0.24 cpus, so it is capped at 1 cpu
+    np.testing.assert_allclose(allocation.limits, [1, 3.6 + 5 * 0.6, 2.4 + 5 * 0.4])
+    assert allocation.blkio_weights[0] == 1000
+    assert list(allocation.blkio_weights[1:]) == [DEFAULT_BLKIO_WEIGHT] * 2
+
+
+def test_io_aware_gives_completing_io_bound_containers_the_minimum_weight():
+    policy = IOAwarePolicy(Algo1Policy(alpha=0.03), io_threshold=5e6)
+    s = snapshot([0.01, 0.5], completing=[True, False], limits=[4, 4], cpu_mean=[0.01, 0.1], io_rate=[1e7, 1e7])
+    assert list(policy.allocate(s).blkio_weights) == [10, 1000]
+
+
+def test_io_aware_restores_the_default_weight():
+    policy = IOAwarePolicy(Algo1Policy(alpha=0.03), io_threshold=5e6)
+    s = snapshot([0.5, 0.3], limits=[4, 4], cpu_mean=[0.35, 0.2], io_rate=[1e7, 0])
+    allocation = policy.allocate(s)
+    np.testing.assert_allclose(allocation.limits, Algo1Policy(alpha=0.03).allocate(s).limits)
+    assert list(allocation.blkio_weights) == [DEFAULT_BLKIO_WEIGHT] * 2
+
+
+def test_io_aware_wraps_alpha_and_empty_snapshots():
+    policy = IOAwarePolicy(make_policy('deadline'))
+    policy.alpha = 0.1
+    assert policy.policy.alpha == 0.1 and policy.name == 'deadline+io'
+    assert len(policy.allocate(snapshot([])).blkio_weights) == 0
+
+
+def run_io_aware(policy, demand, io_rate, ticks, growth=None, n_cpus=10):
+    """Run `policy` for several ticks, with each container using up to its demand under the limit from the last tick
+
+    :return: the list of Allocations
+    """
+    n = len(demand)
+    growth = [0.2] * n if growth is None else growth
+    limits = np.full(n, float(n_cpus))
+    allocations = []
+    for _ in range(ticks):
+        used = np.minimum(demand, limits)
+        s = snapshot(growth, limits=limits, cpu_mean=used / n_cpus, io_rate=io_rate, n_cpus=n_cpus)
+        allocation = policy.allocate(s)
+        limits = np.where(np.isnan(allocation.limits), limits, allocation.limits)
+        allocations.append(allocation)
+    return allocations
+
+
+@pytest.mark.parametrize('base', [EqualSharePolicy(), Algo1Policy(alpha=0.03)])
+def test_io_aware_limits_and_weights_settle(base):
+    allocations = run_io_aware(IOAwarePolicy(base), demand=[1.5, 10], io_rate=[2e7, 0], ticks=8)
+    for allocation in allocations[1:]:
+        np.testing.assert_allclose(allocation.limits, allocations[0].limits)
+        np.testing.assert_allclose(allocation.blkio_weights, allocations[0].blkio_weights)
+    assert allocations[0].limits[0] == pytest.approx(2.25)
+    assert allocations[0].blkio_weights[0] == 1000
+
+
+def test_io_aware_releases_a_container_that_becomes_cpu_bound():
+    policy = IOAwarePolicy(EqualSharePolicy())
+    capped = run_io_aware(policy, demand=[1.5, 10], io_rate=[2e7, 0], ticks=2)[-1]
+    assert capped.limits[0] == pytest.approx(2.25)
+
+    # Now the first container could use the whole host: it saturates its cap and gets the policy's limit back
+    s = snapshot([0.2, 0.2], limits=capped.limits, cpu_mean=np.array([2.25, 7.75]) / 10, io_rate=[2e7, 0],
+                 n_cpus=10)
+    assert list(policy.allocate(s).limits) == [5, 5]
@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+import app.resource_monitor as resource_monitor
+from app.resource_monitor import ResourceMonitor
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def monitor_factory(monkeypatch):
+    """Build a ResourceMonitor whose docker calls, clock and CPU accounting are simulated
+
+    :return: a function taking the monitor's keyword arguments and the controller's CPU use in cpus, and returning
+             (monitor, clock, sampled) where sampled lists the time and container IDs of every `docker stats` call
+    """
+    clock = Clock()
+    sampled = []
+
+    def check_stats(ids=()):
+        sampled.append((clock.now, list(ids)))
+        return pd.DataFrame(dict(container_id=list(ids), cpu_pct='10%', mem_use='1MiB', mem_max='1GiB', mem_pct='0%',
+                                 net_in='0B', net_out='0B', block_in='0B', block_out='0B', pids='1',
+                                 time=clock.now))
+
+    monkeypatch.setattr(resource_monitor, 'time', clock)
+    monkeypatch.setattr(resource_monitor.utils, 'get_active_containers', lambda: ['stable', 'busy'])
+    monkeypatch.setattr(ResourceMonitor, '_check_stats', staticmethod(check_stats))
+
+    def make(controller_cpus=0.0, **kwargs):
+        monkeypatch.setattr(ResourceMonitor, '_cpu_time', staticmethod(lambda: clock.now * controller_cpus))
+        return ResourceMonitor(**kwargs), clock, sampled
+
+    return make
+
+
+def run_ticks(monitor, clock, sampled, ticks):
+    monitor.set_stable('stable', True)
+    monitor.set_stable('busy', False)
+    for _ in range(ticks):
+        clock.now += monitor._update_interval
+        monitor._update()
+    return {c_id: sum(c_id in ids for _, ids in sampled) for c_id in ['stable', 'busy']}
+
+
+def test_stable_containers_are_sampled_less_often(monitor_factory):
+    # The defaults of run_trial.py: a 30 s algorithm interval and docker stats every 10 s
+    monitor, clock, sampled = monitor_factory(update_interval=10, cpu_budget=0.05, max_interval=30 - 10)
+    counts = run_ticks(monitor, clock, sampled, 30)
+    assert counts['busy'] == 30
+    assert counts['stable'] < 20
+
+
+def test_over_budget_stretches_every_interval_up_to_the_cap(monitor_factory):
+    monitor, clock, sampled = monitor_factory(controller_cpus=1.0, update_interval=10, cpu_budget=0.05,
+                                              max_interval=30 - 10)
+    counts = run_ticks(monitor, clock, sampled, 30)
+    assert counts['busy'] < 20 and counts['stable'] < 20
+    # Never more than max_interval between two samples, so every 30 s window still sees one
+    times = [t for t, ids in sampled if 'stable' in ids]
+    assert max(b - a for a, b in zip(times, times[1:])) <= 20
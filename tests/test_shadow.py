@@ -0,0 +1,23 @@
+import os
+
+import pandas as pd
+import pytest
+
+from app.shadow import ShadowPolicy
+
+
+@pytest.mark.parametrize('spec, filename', [
+    ('0.05:60', 'exp_shadow_a0.05_i60_iters.csv'),
+    ('equal_share:0:30', 'exp_shadow_equal_share_a0_i30_iters.csv'),
+    ('deadline:0.03:30:2', 'exp_shadow_deadline_a0.03_i30_b2_iters.csv'),
+])
+def test_status_is_saved_under_the_shadow_policy_name(tmp_path, spec, filename):
+    shadow = ShadowPolicy.from_spec(spec)
+    shadow.status = pd.DataFrame(dict(iter=[0]))
+    shadow.to_csv(str(tmp_path / 'exp'))
+    assert os.listdir(str(tmp_path)) == [filename]
+
+
+def test_rejects_malformed_specs():
+    with pytest.raises(ValueError):
+        ShadowPolicy.from_spec('equal_share:30')
@@ -0,0 +1,42 @@
+import pytest
+
+from app.tuner import Tuner
+
+
+def test_keeps_improvements_and_undoes_regressions():
+    tuner = Tuner(alpha=0.03, interval=30, epoch=1, step=0.5)
+    assert tuner.observe(1.0) == dict(alpha=pytest.approx(0.045), interval=30)
+    # Better: keep moving alpha up
+    assert tuner.observe(2.0) == dict(alpha=pytest.approx(0.0675), interval=30)
+    # Worse: undo, then try the other direction from the best setting
+    assert tuner.observe(1.0) == dict(alpha=pytest.approx(0.03), interval=30)
+    # Worse again: both directions failed, so go back and move on to the interval
+    assert tuner.observe(1.0) == dict(alpha=pytest.approx(0.045), interval=45)
+    assert tuner.steps['alpha'] == 0.25
+
+
+def test_averages_over_an_epoch_and_skips_missing_objectives():
+    tuner = Tuner(alpha=0.03, interval=30, epoch=3)
+    assert tuner.observe(1.0) is None
+    assert tuner.observe(None) is None
+    assert tuner.observe(1.0) is None
+    assert tuner.observe(1.0) is not None
+
+
+def test_clamps_to_bounds():
+    tuner = Tuner(alpha=0.2, interval=30, alpha_bounds=(0.005, 0.2), epoch=1, step=0.5)
+    # alpha is already at its upper bound, so the first move is down
+    assert tuner.observe(1.0) == dict(alpha=pytest.approx(0.2 / 1.5), interval=30)
+
+    tuner = Tuner(alpha=0.03, interval=100, interval_bounds=(10, 120), epoch=1, step=0.5)
+    tuner._param = 'interval'
+    assert tuner.observe(1.0) == dict(alpha=0.03, interval=120)
+
+
+def test_small_intervals_move_by_at_least_a_second():
+    tuner = Tuner(alpha=0.03, interval=10, alpha_bounds=(0.03, 0.03), interval_bounds=(5, 120), epoch=1,
+                  step=0.05)
+    # alpha cannot move at all, so the tuner gives up on it and moves the interval
+    assert tuner.observe(1.0) is None
+    assert tuner.observe(1.0) == dict(alpha=0.03, interval=11)
+    assert tuner.observe(0.5) == dict(alpha=0.03, interval=9)
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_queued_records_are_written_when_the_process_dies(tmp_path):
+    script = ("from utils import get_logger\n"
+              "logger = get_logger('test')\n"
+              "for i in range(2000):\n"
+              "    logger.info('line %d', i)\n"
+              "raise RuntimeError('exiting without stopping the log writer')\n")
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    result = subprocess.run([sys.executable, '-c', script], cwd=str(tmp_path), env=env, stderr=subprocess.PIPE)
+    assert result.returncode != 0
+
+    with open(str(tmp_path / 'FlowCon.log')) as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 2000
+    assert lines[-1].endswith('line 1999')
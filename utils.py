@@ -1,5 +1,9 @@
-import subprocess
+import atexit
+import json
 import logging
+import queue
+import subprocess
+from logging.handlers import QueueHandler, QueueListener
 
 
 # TODO set this up at some point. removes clutter from main
@@ -28,6 +32,15 @@ def kill_containers_by_id(active_containers):
     return True
 
 
+def get_container_labels(c_id):
+    """Return the labels of a container as a dict
+
+    run_trial.run_job_list sets `flowcon.priority` and `flowcon.deadline` (an absolute unix time) from the joblist.
+    """
+    out = subprocess.check_output(['docker', 'inspect', '--format', '{{json .Config.Labels}}', c_id])
+    return json.loads(out.decode('ascii')) or {}
+
+
 def get_active_containers():
     """Return the number of currently running containers"""
     out = subprocess.check_output(['docker', 'ps', '-q'])
@@ -40,11 +53,93 @@ def get_active_containers():
     return active_containers
 
 
-def get_logger(name, fn='FlowCon.log', fmt='%(asctime)s:%(levelname)s:%(name)s:%(message)s'):
-    logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    formatter = logging.Formatter(fmt)
+class _LazyQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the writer thread
+
+    The stock QueueHandler formats each record in the calling thread so that it can be pickled. Our queue never
+    leaves the process, so the record is enqueued as is and `msg % args` only runs on the background writer.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Format each record as one JSON object per line, including any fields passed through `extra`"""
+
+    _reserved = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = dict(time=record.created, level=record.levelname, name=record.name, thread=record.threadName,
+                     message=record.getMessage())
+        for key, value in vars(record).items():
+            if key not in self._reserved:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+_queue = queue.Queue(-1)
+_queue_handler = _LazyQueueHandler(_queue)
+_listener = None
+_loggers = {}
+
+
+def start_logging(fn='FlowCon.log', fmt='%(asctime)s:%(levelname)s:%(name)s:%(message)s', structured=False):
+    """Start the background thread that writes every FlowCon log record to `fn`
+
+    Does nothing if it is already running; call `stop_logging` first to change the file or format. The writer thread
+    is a daemon, so `stop_logging` is registered to run at exit and write out whatever is still queued.
+
+    :param fn: the log file, opened once in append mode
+    :param fmt: format of each line if not `structured`
+    :param structured: write JSON lines (see JsonFormatter) instead of `fmt`
+    """
+    global _listener
+    if _listener is not None:
+        return
     fh = logging.FileHandler(fn)
-    fh.setFormatter(formatter)
-    logger.addHandler(fh)
-    return logger
+    fh.setFormatter(JsonFormatter() if structured else logging.Formatter(fmt))
+    _listener = QueueListener(_queue, fh)
+    _listener.start()
+    atexit.unregister(stop_logging)
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Write out every queued record, then stop the writer thread and close the log file"""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+def set_log_levels(levels):
+    """Set the level of each subsystem's loggers
+
+    :param levels: a dict mapping a logger name, or a dotted prefix such as 'app', to a level name or number
+    """
+    for prefix, level in levels.items():
+        level = level.upper() if isinstance(level, str) else level
+        for name, logger in _loggers.items():
+            if name == prefix or name.startswith(prefix + '.'):
+                logger.setLevel(level)
+
+
+def get_logger(name, fn='FlowCon.log', fmt='%(asctime)s:%(levelname)s:%(name)s:%(message)s'):
+    """Return the logger for `name`, attached to the shared queue and writer thread
+
+    :param fn: passed to `start_logging` if the writer thread is not yet running
+    :param fmt: passed to `start_logging` if the writer thread is not yet running
+    """
+    start_logging(fn, fmt)
+    if name not in _loggers:
+        logger = logging.getLogger(name)
+        logger.setLevel(logging.INFO)
+        logger.addHandler(_queue_handler)
+        _loggers[name] = logger
+    return _loggers[name]